@@ -0,0 +1,164 @@
+"""Times loading, tree building, drawing, repainting, export and saving on a
+generated tree.
+
+    python benchmark.py --generations 10 --repeat 5 --output results.json
+
+Runs under the offscreen Qt platform and prints the results as JSON, with
+the tree options and the git commit, so runs of different versions can be
+compared. Every step is run --repeat times on the same tree, the reference
+person is someone from the middle generation so the chart has ancestors
+and descendants.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+# has to be set before the QApplication is created
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PySide6
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QPointF
+from person import Person
+from family_graph import FamilyGraph
+from family_io import load_graph, save_graph
+from family_roots import FamilyRoots
+from family_branches import FamilyBranches
+from family_tree_view import FamilyTreeView
+from graph_person import GraphPerson
+from tree_layout import DEFAULT_DEPTH, plan_tree
+from synthetic_tree import generate_tree, shape_arguments, shape_from_arguments
+
+# size of the view repainted by the repaint steps
+VIEW_WIDTH: int = 1600
+VIEW_HEIGHT: int = 1000
+# boxes built by the build_boxes step
+BOXES: int = 2000
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, object]:
+    """Runs func repeat times, returns the times in seconds with their min and median."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"runs": runs, "min": min(runs), "median": statistics.median(runs)}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def middle_person(people: List[Person]) -> Person:
+    """Someone with both parents and kids from the middle of the tree."""
+    linked = [p for p in people if p.parents and p.kids]
+    return linked[len(linked) // 2] if linked else people[0]
+
+def build_items(graph: FamilyGraph, ref: Person, depth: int):
+    plan = plan_tree(graph, ref, depth)
+    items = [FamilyRoots(plan.roots.root, None)]
+    items += [FamilyBranches(placed.root, None) for placed in plan.branches]
+    return items
+
+def build_boxes(people: List[Person]) -> List[GraphPerson]:
+    return [GraphPerson(person, None) for person in people[:BOXES]]
+
+def repaint(tree_view: FamilyTreeView, center: QPointF, zoom: float, step: int):
+    """Paints the view at zoom, scrolled step boxes to the right of center,
+    the way a scroll or an expose repaints it.
+    """
+    view = tree_view.graph_view
+    view.resetTransform()
+    view.scale(zoom, zoom)
+    view.centerOn(center + QPointF(step * GraphPerson.WIDTH, 0))
+    view.viewport().grab()
+
+def run_benchmarks(people: List[Person], repeat: int, depth: int, scale: float, folder: str) -> Dict[str, Dict[str, object]]:
+    results: Dict[str, Dict[str, object]] = {}
+    json_path = os.path.join(folder, "family.json")
+    image_path = os.path.join(folder, "tree.jpg")
+    graph = FamilyGraph(people)
+    ref = middle_person(people)
+
+    dicts = [p.to_dict() for p in people]
+    results["from_dict"] = measure(lambda: [Person.from_dict(x) for x in dicts], repeat)
+    results["save_json"] = measure(lambda: save_graph(json_path, graph), repeat)
+    results["load_json"] = measure(lambda: load_graph(json_path), repeat)
+    results["plan_tree"] = measure(lambda: plan_tree(graph, ref, depth), repeat)
+    results["build_items"] = measure(lambda: build_items(graph, ref, depth), repeat)
+
+    def first_draw():
+        tree_view = FamilyTreeView(None, depth=depth)
+        tree_view.select_ref(ref)
+        tree_view.set_people(graph)
+        return tree_view
+    results["draw_tree"] = measure(first_draw, repeat)
+
+    # the items of the previous drawing are reused from here on
+    tree_view = first_draw()
+    results["redraw_tree"] = measure(tree_view.draw_tree, repeat)
+    results["build_boxes"] = measure(lambda: build_boxes(people), repeat)
+
+    # the first paint at a zoom level lays out and caches the boxes, the later
+    # ones are what scrolling costs
+    tree_view.graph_view.resize(VIEW_WIDTH, VIEW_HEIGHT)
+    center = tree_view.scene.itemsBoundingRect().center()
+    for name, zoom in (("repaint", 1.0), ("repaint_zoomed_out", 0.5)):
+        steps = iter(range(repeat + 1))
+        results[name + "_first"] = measure(lambda: repaint(tree_view, center, zoom, 0), 1)
+        results[name] = measure(lambda: repaint(tree_view, center, zoom, next(steps) % 3), repeat)
+    try:
+        results["export_to_jpeg"] = measure(lambda: tree_view.export_to_jpeg(image_path, scale), repeat)
+    except ValueError as e:
+        # the chart is too large for a JPEG at this scale
+        results["export_to_jpeg"] = {"error": str(e)}
+    return results
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the family tree editor on a generated tree.")
+    shape_arguments(parser)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="generations drawn each way, 0 draws the whole tree")
+    parser.add_argument("--scale", type=float, default=0.25, help="scale of the exported image")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each step")
+    parser.add_argument("--output", default=None, help="JSON file for the results, printed when not given")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    shape = shape_from_arguments(args)
+    start = time.perf_counter()
+    people = generate_tree(shape)
+    generate_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as folder:
+        results = run_benchmarks(people, args.repeat, args.depth or None, args.scale, folder)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pyside": PySide6.__version__,
+        "platform": platform.platform(),
+        "shape": vars(shape),
+        "depth": args.depth,
+        "scale": args.scale,
+        "people": len(people),
+        "generate": generate_time,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,78 +8,61 @@ from PySide6.QtWidgets import (
 from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter
 from PySide6.QtCore import QRectF, Qt
 from person import Person
+from family_graph import FamilyGraph
 from graph_person import GraphPerson
-from family_unit import FamilyUnit, MARGIN, MARGIN_UNITS
+from family_unit import FamilyUnit, UnitPool, MARGIN, MARGIN_UNITS
+import profiling
+from tree_layout import LayoutUnit, build_descendants, layout_descendants
 
 class FamilyBranches(QGraphicsItem):
     GEN_OFFSET: int = GraphPerson.HEIGHT + MARGIN_UNITS
+    # shown on couples drawn a second time, their descendants are drawn at the first one
+    REPEAT_MARKER: str = "see left"
 
-    def __init__(self, reference_person: Person, people: List[Person], click_callback, parent = None, move_child_right: int = None,  move_child_left: int = None):
+    def __init__(self, ref_node: LayoutUnit, click_callback, parent = None, lazy_details: bool = False, mark_repeats: bool = True, expand_callback = None):
+        """ref_node has to be already positioned by tree_layout.layout_descendants"""
         super().__init__(parent)
 
-        self.move_child_right = move_child_right
-        self.move_child_left = move_child_left
-
-        self.max_gen_num = 0
-        self.gen_counter = 0
         self.units: List[FamilyUnit] = []
         self.click_callback = click_callback
-        self.ref_unit: FamilyUnit = self.build_unit(reference_person, people)
-
-        self.ref_unit.setPos(0,0)
-        self.y_offset = 0
-        self.draw_unit(self.ref_unit,0)
-        self.ref_unit.draw_heads_connection()
-
-    def build_unit(self, person: Person, people: List[Person]) -> FamilyUnit:
-        unit: FamilyUnit = FamilyUnit(person, people, self, self.click_callback)
+        self.mark_repeats = mark_repeats
+        # called with the key of a unit at the depth limit when its button is clicked
+        self.expand_callback = expand_callback
+        self.unit_pool = UnitPool(self, click_callback, lazy_details)
+        self.set_layout(ref_node)
+
+    def set_layout(self, ref_node: LayoutUnit):
+        """Shows a newly laid out tree, reusing the unit items of the previous one."""
+        self.prepareGeometryChange()
+        self.unit_pool.begin()
+        self.units = []
+        with profiling.span("build_unit"):
+            self.ref_unit: FamilyUnit = self.build_unit(ref_node)
+        self.unit_pool.end()
+        self.max_gen_num = int(max(unit.node.y for unit in self.units) / self.GEN_OFFSET)
+        self.draw_units()
+
+    def build_unit(self, node: LayoutUnit) -> FamilyUnit:
+        unit: FamilyUnit = self.unit_pool.acquire(node)
         self.units.append(unit)
-        children_units: List[FamilyUnit] = []
-
-        kid_ids = person.kids
-        if self.move_child_right and self.move_child_right in kid_ids:
-            kid_ids.remove(self.move_child_right)
-            kid_ids.append(self.move_child_right)
-        
-        if self.move_child_left and self.move_child_left in kid_ids:
-            kid_ids.remove(self.move_child_left)
-            kid_ids.insert(0,self.move_child_left)
-
-        for kid_id in kid_ids:
-            for kid in (kid for kid in people if kid_id == kid.id):
-                self.gen_counter += 1
-                children_units.append(self.build_unit(kid, people))
-                self.max_gen_num = max(self.max_gen_num, self.gen_counter)
-                self.gen_counter -= 1
-        unit.add_children_units(children_units)
+        unit.add_children_units([self.build_unit(kid) for kid in node.children])
         return unit
     
-    def draw_unit(self, unit: FamilyUnit, parent_offset_x: int):
-        children_width = 0
-        child_offset_x = parent_offset_x
-        unit.align(unit.get_width(with_children=True))
-
-        for kid_unit in unit.children_units:
-            self.y_offset += self.GEN_OFFSET
-            kid_unit.setPos(child_offset_x, self.y_offset)
-            self.draw_unit(kid_unit,child_offset_x)
-            self.y_offset -= self.GEN_OFFSET
-            child_offset_x += kid_unit.get_width(with_children=True) + MARGIN_UNITS
-            children_width += kid_unit.get_width(with_children=True)
-        
-        children_width += (len(unit.children_units) - 1) * MARGIN_UNITS if len(unit.children_units) > 0 else 0
-        
-        if children_width < unit.get_width(with_children=True):
-            child_offset_x = parent_offset_x + (unit.get_width(with_children=True) - children_width) / 2
-            for child_unit in unit.children_units:
-                child_unit.setPos(child_offset_x, child_unit.y())
-                child_offset_x += child_unit.get_width(with_children=True) + MARGIN_UNITS
-                
-        for kid_unit in unit.children_units:
-            kid_unit.draw_heads_connection()
+    @profiling.timed()
+    def draw_units(self):
+        for unit in self.units:
+            unit.apply_layout()
+            unit.show_repeat_marker(self.REPEAT_MARKER if self.mark_repeats and unit.node.repeat_of else None, above=False)
+            unit.show_expand_buttons(self.expander(unit.node) if self.expand_callback else None)
+        with profiling.span("draw_heads_connection"):
+            for unit in self.units:
+                unit.draw_heads_connection()
     
+    def expander(self, node: LayoutUnit):
+        return lambda: self.expand_callback(node.key)
+
     def get_width(self):
-        return self.ref_unit.get_width(with_children=True)
+        return self.ref_unit.node.width
     
     def get_height(self):
         return self.max_gen_num * GraphPerson.HEIGHT + (self.max_gen_num - 1) + MARGIN_UNITS
@@ -159,18 +142,25 @@ if __name__ == "__main__":
     view = QGraphicsView(scene)
     view.setRenderHint(QPainter.Antialiasing)
 
+    graph = FamilyGraph(people)
+
+    def laid_out(**kwargs) -> LayoutUnit:
+        ref_node = build_descendants(people[0], graph, **kwargs)
+        layout_descendants(ref_node)
+        return ref_node
+
     # Add to scene
-    branches = FamilyBranches(people[0], people, lambda arg: print(arg))
+    branches = FamilyBranches(laid_out(), lambda arg: print(arg))
     branches.setPos(MARGIN, MARGIN)
     scene.addItem(branches)
     
     # Add to scene child rigth
-    branches1 = FamilyBranches(people[0], people, lambda arg: print(arg), move_child_left=5)
+    branches1 = FamilyBranches(laid_out(move_child_left=5), lambda arg: print(arg))
     branches1.setPos(MARGIN, MARGIN + branches.get_height() + GraphPerson.HEIGHT * 2 + MARGIN_UNITS)
     scene.addItem(branches1)
     
     # Add to scene child left
-    branches2 = FamilyBranches(people[0], people, lambda arg: print(arg), move_child_right=5)
+    branches2 = FamilyBranches(laid_out(move_child_right=5), lambda arg: print(arg))
     branches2.setPos(MARGIN, MARGIN + branches.get_height() + branches1.get_height() + GraphPerson.HEIGHT * 2 + MARGIN_UNITS)
     scene.addItem(branches2)
 
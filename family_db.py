@@ -0,0 +1,224 @@
+import json
+import sqlite3
+from dataclasses import replace
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from family_graph import FamilyGraph
+from family_io import iter_people
+from person import Person
+
+DB_EXTENSIONS = (".db", ".sqlite")
+FIELDS = ("id", "name", "middle_name", "last_name", "family_name", "birth_date", "death_date", "notes", "photo_source")
+RELATIONS = ("parents", "kids", "partners")
+# stays below the default SQLITE_MAX_VARIABLE_NUMBER of old sqlite builds
+QUERY_BATCH: int = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    middle_name TEXT NOT NULL DEFAULT '',
+    last_name TEXT NOT NULL DEFAULT '',
+    family_name TEXT NOT NULL DEFAULT '',
+    birth_date TEXT NOT NULL DEFAULT '',
+    death_date TEXT NOT NULL DEFAULT '',
+    notes TEXT NOT NULL DEFAULT '',
+    photo_source TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS relations (
+    person_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    other_id INTEGER NOT NULL,
+    PRIMARY KEY (person_id, kind, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS people_names ON people (last_name, name);
+CREATE INDEX IF NOT EXISTS people_birth_date ON people (birth_date);
+CREATE INDEX IF NOT EXISTS relations_other ON relations (other_id);
+"""
+
+def is_database(filename: str) -> bool:
+    return filename.lower().endswith(DB_EXTENSIONS)
+
+def connect(filename: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(filename)
+    conn.executescript(SCHEMA)
+    return conn
+
+def person_row(person: Person) -> tuple:
+    return tuple(getattr(person, name) for name in FIELDS)
+
+def relation_rows(person: Person) -> Iterator[tuple]:
+    for kind in RELATIONS:
+        for position, other_id in enumerate(getattr(person, kind)):
+            yield (person.id, kind, position, other_id)
+
+def write_people(conn: sqlite3.Connection, people: List[Person]):
+    """Inserts or replaces people together with their relation lists, the
+    caller owns the transaction.
+    """
+    conn.executemany(f"INSERT OR REPLACE INTO people ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})", [person_row(p) for p in people])
+    for start in range(0, len(people), QUERY_BATCH):
+        ids = [p.id for p in people[start:start + QUERY_BATCH]]
+        conn.execute(f"DELETE FROM relations WHERE person_id IN ({', '.join('?' * len(ids))})", ids)
+    conn.executemany("INSERT INTO relations VALUES (?, ?, ?, ?)", [row for p in people for row in relation_rows(p)])
+
+def read_people(conn: sqlite3.Connection, ids: List[int]) -> List[Person]:
+    """Fetches people with their relation lists, unknown ids are skipped."""
+    people: Dict[int, Person] = {}
+    for start in range(0, len(ids), QUERY_BATCH):
+        batch = ids[start:start + QUERY_BATCH]
+        marks = ", ".join("?" * len(batch))
+        for row in conn.execute(f"SELECT {', '.join(FIELDS)} FROM people WHERE id IN ({marks})", batch):
+            people[row[0]] = Person(*row)
+        for person_id, kind, other_id in conn.execute(f"SELECT person_id, kind, other_id FROM relations WHERE person_id IN ({marks}) ORDER BY person_id, kind, position", batch):
+            person = people.get(person_id)
+            if person is not None:
+                getattr(person, kind).append(other_id)
+    return list(people.values())
+
+# =======================
+# LAZY GRAPH
+# =======================
+
+class SqliteFamilyGraph(FamilyGraph):
+    """FamilyGraph backed by a SQLite file.
+
+    people and the adjacency maps only hold the people fetched so far. get()
+    and resolve() fetch missing people on demand, so drawing a chart reads the
+    people in it and nothing else. add, update and remove write through to the
+    database right away.
+    """
+
+    # sqlite connections belong to the thread that opened them
+    concurrent_reads: bool = False
+
+    def __init__(self, filename: str):
+        super().__init__()
+        self.filename = filename
+        self.conn = connect(filename)
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM people").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Person]:
+        """Iterates every person in the database, fetching them in batches."""
+        ids = [row[0] for row in self.conn.execute("SELECT id FROM people ORDER BY last_name, name")]
+        for start in range(0, len(ids), QUERY_BATCH):
+            yield from self.resolve(ids[start:start + QUERY_BATCH])
+
+    def __contains__(self, id: int) -> bool:
+        return id in self.people or self.conn.execute("SELECT 1 FROM people WHERE id = ?", (id,)).fetchone() is not None
+
+    def fetch(self, ids: Iterable[int]):
+        missing = [id for id in ids if id not in self.people]
+        for person in read_people(self.conn, missing):
+            self.people[person.id] = person
+            self._index(person)
+
+    def get(self, id: int) -> Optional[Person]:
+        if id not in self.people:
+            self.fetch([id])
+        return self.people.get(id)
+
+    def resolve(self, ids: Iterable[int]) -> List[Person]:
+        ids = list(ids)
+        self.fetch(ids)
+        return super().resolve(ids)
+
+    def name_keys(self) -> Iterator[Tuple[str, int]]:
+        # same as Person.sort_name, without fetching the people
+        return self.conn.execute("SELECT last_name || ' ' || name, id FROM people")
+
+    def next_id(self) -> int:
+        return (self.conn.execute("SELECT MAX(id) FROM people").fetchone()[0] or 0) + 1
+
+    def add(self, person: Person):
+        super().add(person)
+        with self.conn:
+            write_people(self.conn, [person])
+
+    def update(self, person: Person):
+        super().update(person)
+        if person.id in self.people:
+            with self.conn:
+                write_people(self.conn, [person])
+
+    def remove(self, person: Person) -> List[Person]:
+        """Removes the person and strips its id from everyone linked to it in
+        one transaction, the people in memory change once it is committed.
+        """
+        id = person.id
+        self.fetch([id])
+        if id not in self.people:
+            return []
+        # everyone linked either way has to be in memory to get the id stripped
+        linked = {row[0] for row in self.conn.execute("SELECT person_id FROM relations WHERE other_id = ?", (id,))}
+        for list_name in RELATIONS:
+            linked.update(getattr(self, list_name).get(id, ()))
+        linked.discard(id)
+        self.fetch(linked)
+        touched = self.resolve(linked)
+        stripped = [replace(other, **{kind: [x for x in getattr(other, kind) if x != id] for kind in RELATIONS}) for other in touched]
+        with self.conn:
+            write_people(self.conn, stripped)
+            self.conn.execute("DELETE FROM people WHERE id = ?", (id,))
+            self.conn.execute("DELETE FROM relations WHERE person_id = ?", (id,))
+
+        del self.people[id]
+        for list_name in RELATIONS:
+            getattr(self, list_name).pop(id, None)
+        for other, new in zip(touched, stripped):
+            # the lists are edited in place, views hold on to these people
+            for kind in RELATIONS:
+                getattr(other, kind)[:] = getattr(new, kind)
+            self._index(other)
+        self._notify("remove", person)
+        for other in touched:
+            self._notify("update", other)
+        return touched
+
+# =======================
+# JSON IMPORT / EXPORT
+# =======================
+
+def import_json(json_filename: str, db_filename: str, progress: Callable[[int, int], None] = None) -> SqliteFamilyGraph:
+    """Copies a family JSON file into a database, replacing people with the same ids."""
+    graph = SqliteFamilyGraph(db_filename)
+    with graph.conn:
+        for batch in iter_people(json_filename, progress=progress):
+            write_people(graph.conn, batch)
+    return graph
+
+def save_database(db_filename: str, graph: FamilyGraph):
+    """Writes a graph held in memory into a database."""
+    conn = connect(db_filename)
+    with conn:
+        conn.execute("DELETE FROM people")
+        conn.execute("DELETE FROM relations")
+        write_people(conn, list(graph))
+    conn.close()
+
+def export_json(graph: SqliteFamilyGraph, json_filename: str):
+    """Writes the database in the family JSON format, one person at a time
+    without keeping them in memory.
+    """
+    with open(json_filename, "w", encoding="utf-8") as f:
+        f.write('{\n  "people": [')
+        separator = "\n"
+        last_id = None
+        while True:
+            if last_id is None:
+                rows = graph.conn.execute("SELECT id FROM people ORDER BY id LIMIT ?", (QUERY_BATCH,))
+            else:
+                rows = graph.conn.execute("SELECT id FROM people WHERE id > ? ORDER BY id LIMIT ?", (last_id, QUERY_BATCH))
+            ids = [row[0] for row in rows]
+            if not ids:
+                break
+            last_id = ids[-1]
+            for person in sorted(read_people(graph.conn, ids), key= lambda p: p.id):
+                f.write(separator + "    " + json.dumps(person.to_dict(), indent=2).replace("\n", "\n    "))
+                separator = ",\n"
+        f.write("\n  ]\n}")
@@ -0,0 +1,110 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from person import Person
+
+class FamilyGraph:
+    """Id-indexed store of people with adjacency maps for parents, kids and partners.
+
+    The adjacency maps mirror the id lists kept on each Person and have to be
+    refreshed with update() whenever those lists are edited in place. They
+    hold tuples, which are smaller than lists and shared when empty.
+    Registered callbacks are told about every add, update and remove.
+    """
+
+    # trees may be planned from a worker thread while the GUI thread edits
+    concurrent_reads: bool = True
+
+    def __init__(self, people: Iterable[Person] = ()):
+        self.people: Dict[int, Person] = {}
+        self.parents: Dict[int, Tuple[int, ...]] = {}
+        self.kids: Dict[int, Tuple[int, ...]] = {}
+        self.partners: Dict[int, Tuple[int, ...]] = {}
+        self._callbacks: List[Callable[[str, Person], None]] = []
+        for person in people:
+            self.add(person)
+
+    def register_callback(self, func: Callable[[str, Person], None]):
+        """Registers a function called with (action, person) after each change,
+        action is "add", "update" or "remove".
+        """
+        if func not in self._callbacks:
+            self._callbacks.append(func)
+
+    def unregister_callback(self, func: Callable[[str, Person], None]):
+        if func in self._callbacks:
+            self._callbacks.remove(func)
+
+    def _notify(self, action: str, person: Person):
+        for callback in self._callbacks:
+            try:
+                callback(action, person)
+            except Exception as e:
+                print(f"Error in callback: {e}")
+
+    def __len__(self) -> int:
+        return len(self.people)
+
+    def __iter__(self) -> Iterator[Person]:
+        return iter(self.people.values())
+
+    def __contains__(self, id: int) -> bool:
+        return id in self.people
+
+    def get(self, id: int) -> Optional[Person]:
+        return self.people.get(id)
+
+    def resolve(self, ids: Iterable[int]) -> List[Person]:
+        """Returns the people for the given ids, skipping unknown ones."""
+        people = self.people
+        return [people[id] for id in ids if id in people]
+
+    def parents_of(self, person: Person) -> List[Person]:
+        return self.resolve(self.parents.get(person.id, ()))
+
+    def kids_of(self, person: Person) -> List[Person]:
+        return self.resolve(self.kids.get(person.id, ()))
+
+    def partners_of(self, person: Person) -> List[Person]:
+        return self.resolve(self.partners.get(person.id, ()))
+
+    def name_keys(self) -> Iterator[Tuple[str, int]]:
+        """(sort name, id) of everyone, enough to order a list without the people."""
+        return ((person.sort_name, person.id) for person in self.people.values())
+
+    def next_id(self) -> int:
+        return max(self.people, default=0) + 1
+
+    def add(self, person: Person):
+        self.people[person.id] = person
+        self._index(person)
+        self._notify("add", person)
+
+    def update(self, person: Person):
+        """Re-reads the relation lists of an edited person into the adjacency maps."""
+        self._index(person)
+        self._notify("update", person)
+
+    def _index(self, person: Person):
+        self.parents[person.id] = tuple(person.parents)
+        self.kids[person.id] = tuple(person.kids)
+        self.partners[person.id] = tuple(person.partners)
+
+    def remove(self, person: Person) -> List[Person]:
+        """Removes a person and strips its id from everyone linked to it.
+        Returns the people whose relation lists were changed.
+        """
+        if self.people.pop(person.id, None) is None:
+            return []
+        touched: Dict[int, Person] = {}
+        for list_name in ("parents", "kids", "partners"):
+            for other_id in getattr(self, list_name).pop(person.id, ()):
+                other = self.people.get(other_id)
+                if other is None:
+                    continue
+                for other_list in (other.parents, other.kids, other.partners):
+                    while person.id in other_list:
+                        other_list.remove(person.id)
+                touched[other.id] = other
+        self._notify("remove", person)
+        for other in touched.values():
+            self.update(other)
+        return list(touched.values())
@@ -0,0 +1,239 @@
+import codecs
+import json
+import os
+import re
+import threading
+from typing import Callable, Iterator, List
+from family_graph import FamilyGraph
+from person import Person
+import profiling
+
+CHUNK_SIZE: int = 1 << 20
+BATCH_SIZE: int = 2000
+JOURNAL_SUFFIX: str = ".journal"
+# the journal is folded into the main file once it grows past this many bytes
+COMPACT_SIZE: int = 1 << 20
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+# characters a number can go on with, "1" of "1.5" already parses as a number
+NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*")
+
+class PeopleStreamReader:
+    """Reads the "people" array of a family file one element at a time, so
+    only a chunk of the file is held in memory besides the people built so far.
+    """
+
+    def __init__(self, f, total_size: int = 0, progress: Callable[[int, int], None] = None):
+        self.f = f
+        self.total_size = total_size
+        self.progress = progress
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.bytes_read = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk to the buffer, returns False at the end of the file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        if self.progress:
+            self.progress(self.bytes_read, self.total_size)
+        return not self.eof
+
+    def next_char(self) -> str:
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("unexpected end of the family file")
+
+    def expect(self, char: str):
+        if self.next_char() != char:
+            raise ValueError(f"expected '{char}' at offset {self.bytes_read - len(self.buffer) + self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.next_char()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # a number cut at the end of the buffer still parses, make sure it ended
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    end_of_number = NUMBER_TAIL.match(self.buffer, end).end()
+                else:
+                    end_of_number = end
+                if end_of_number < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def people(self) -> Iterator[dict]:
+        self.expect("{")
+        while self.next_char() != "}":
+            key = self.value()
+            self.expect(":")
+            if key != "people":
+                self.value()
+            else:
+                self.expect("[")
+                while self.next_char() != "]":
+                    yield self.value()
+                    if self.next_char() == ",":
+                        self.pos += 1
+                self.pos += 1
+            if self.next_char() == ",":
+                self.pos += 1
+
+def iter_people(filename: str, batch_size: int = BATCH_SIZE, progress: Callable[[int, int], None] = None) -> Iterator[List[Person]]:
+    """Yields the people of a family file in batches.
+    progress is called with (bytes read, file size) after every chunk.
+    """
+    with open(filename, "rb") as f:
+        reader = PeopleStreamReader(f, os.fstat(f.fileno()).st_size, progress)
+        batch: List[Person] = []
+        for data in reader.people():
+            batch.append(Person.from_dict(data))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+@profiling.timed()
+def load_graph(filename: str, progress: Callable[[int, int], None] = None) -> FamilyGraph:
+    """Loads a family file together with the edits journaled since its last save."""
+    graph = FamilyGraph()
+    for batch in iter_people(filename, progress=progress):
+        for person in batch:
+            graph.add(person)
+    replay_journal(filename, graph)
+    return graph
+
+@profiling.timed()
+def save_graph(filename: str, graph: FamilyGraph):
+    # written next to the file first, so a crash never leaves it half written
+    temp_name = filename + ".tmp"
+    with open(temp_name, "w", encoding="utf-8") as f:
+        json.dump({"people": [p.to_dict() for p in graph]}, f, indent=2)
+    os.replace(temp_name, filename)
+
+# =======================
+# EDIT JOURNAL
+# =======================
+
+def journal_files(filename: str) -> List[str]:
+    """The journal being folded into the file, if any, and the current one, oldest first."""
+    return [filename + JOURNAL_SUFFIX + ".compacting", filename + JOURNAL_SUFFIX]
+
+def replay_journal(filename: str, graph: FamilyGraph):
+    """Applies journaled edits on top of a graph loaded from the family file.
+    Every record holds a whole person, so replaying a record twice is harmless.
+    """
+    for journal_name in journal_files(filename):
+        if os.path.exists(journal_name):
+            replay_journal_file(journal_name, graph)
+
+def replay_journal_file(journal_name: str, graph: FamilyGraph):
+    with open(journal_name, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a record cut short by a crash ends the journal
+                break
+            if "put" in record:
+                graph.add(Person.from_dict(record["put"]))
+            elif record.get("remove") in graph:
+                graph.remove(graph.get(record["remove"]))
+
+class EditJournal:
+    """Appends every change of a graph to <file>.journal as one JSON line,
+    so saving an edit costs the size of the edit and a crash loses nothing.
+
+    Once the journal grows past COMPACT_SIZE it is renamed aside and a
+    background thread folds it into the family file, new edits meanwhile go
+    to a fresh journal.
+    """
+
+    def __init__(self, filename: str, graph: FamilyGraph, compact_size: int = COMPACT_SIZE):
+        self.filename = filename
+        self.graph = graph
+        self.compact_size = compact_size
+        self.compacting_name, self.journal_name = journal_files(filename)
+        # opened on the first edit, so viewing a file leaves no journal behind
+        self.f = None
+        self.compact_thread: threading.Thread = None
+        graph.register_callback(self.record)
+
+    def close(self):
+        self.graph.unregister_callback(self.record)
+        if self.f:
+            self.f.close()
+            self.f = None
+        if self.compact_thread is not None:
+            self.compact_thread.join()
+
+    def record(self, action: str, person: Person):
+        if action == "remove":
+            self.append({"remove": person.id})
+        else:
+            self.append({"put": person.to_dict()})
+
+    def append(self, record: dict):
+        if self.f is None:
+            self.f = open(self.journal_name, "a", encoding="utf-8")
+        self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+        if self.f.tell() >= self.compact_size and not self.is_compacting():
+            self.compact()
+
+    def is_compacting(self) -> bool:
+        return self.compact_thread is not None and self.compact_thread.is_alive()
+
+    def compact(self):
+        """Moves the journal aside and folds it into the family file on a
+        background thread. Until that is done load replays both journals.
+        """
+        if os.path.exists(self.compacting_name):
+            # left over from an interrupted compaction, fold it in first
+            return self.start_compaction()
+        self.f.close()
+        self.f = None
+        os.replace(self.journal_name, self.compacting_name)
+        self.start_compaction()
+
+    def start_compaction(self):
+        self.compact_thread = threading.Thread(target=self.fold, daemon=True)
+        self.compact_thread.start()
+
+    def fold(self):
+        graph = FamilyGraph()
+        for batch in iter_people(self.filename):
+            for person in batch:
+                graph.add(person)
+        replay_journal_file(self.compacting_name, graph)
+        save_graph(self.filename, graph)
+        os.remove(self.compacting_name)
+
+    def save(self):
+        """Writes the whole graph into the family file and starts an empty journal."""
+        if self.compact_thread is not None:
+            self.compact_thread.join()
+        save_graph(self.filename, self.graph)
+        if self.f:
+            self.f.close()
+            self.f = None
+        for journal_name in journal_files(self.filename):
+            if os.path.exists(journal_name):
+                os.remove(journal_name)
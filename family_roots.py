@@ -8,65 +8,61 @@ from PySide6.QtWidgets import (
 from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter
 from PySide6.QtCore import QRectF, Qt
 from person import Person
+from family_graph import FamilyGraph
 from graph_person import GraphPerson
-from family_unit import FamilyUnit, MARGIN, MARGIN_UNITS
+from family_unit import FamilyUnit, UnitPool, MARGIN, MARGIN_UNITS
+import profiling
+from tree_layout import LayoutUnit, build_ancestors, layout_ancestors
 
 class FamilyRoots(QGraphicsItem):
     GEN_OFFSET: int = GraphPerson.HEIGHT + MARGIN_UNITS
+    # shown on couples drawn a second time, their ancestors are drawn at the first one
+    REPEAT_MARKER: str = "see above"
 
-    def __init__(self, reference_person: Person, people: List[Person], click_callback, parent = None):
+    def __init__(self, ref_node: LayoutUnit, click_callback, parent = None, lazy_details: bool = False, mark_repeats: bool = True, expand_callback = None):
+        """ref_node has to be already positioned by tree_layout.layout_ancestors"""
         super().__init__(parent)
 
-        self.max_gen_num = 0
-        self.gen_counter = 0
         self.units_graph: List[FamilyUnit] = []
         self.click_callback = click_callback
-        self.ref_unit: FamilyUnit = self.build_unit(reference_person, people)
+        self.mark_repeats = mark_repeats
+        # called with the key of a unit at the depth limit when its button is clicked
+        self.expand_callback = expand_callback
+        self.unit_pool = UnitPool(self, click_callback, lazy_details)
+        self.set_layout(ref_node)
 
-        self.y_offset = self.max_gen_num * self.GEN_OFFSET
-        self.draw_unit(self.ref_unit,0)
-        self.ref_unit.setPos(0,self.y_offset)
-        self.ref_unit.draw_heads_connection()
+    def set_layout(self, ref_node: LayoutUnit):
+        """Shows a newly laid out tree, reusing the unit items of the previous one."""
+        self.prepareGeometryChange()
+        self.unit_pool.begin()
+        self.units_graph = []
+        with profiling.span("build_unit"):
+            self.ref_unit: FamilyUnit = self.build_unit(ref_node)
+        self.unit_pool.end()
+        self.max_gen_num = int(ref_node.y / self.GEN_OFFSET)
+        self.draw_units()
 
-    def build_unit(self, person: Person, people: List[Person]) -> FamilyUnit:
-        unit: FamilyUnit = FamilyUnit(person, people, self, self.click_callback)
-              
-        units: List[FamilyUnit] = []
-        for id in [head.parents[0] for head in unit.unit_head if head.parents]:
-            for person in (person for person in people if id == person.id):
-                self.gen_counter += 1
-                units.append(self.build_unit(person, people))
-                self.max_gen_num = max(self.max_gen_num, self.gen_counter)
-                self.gen_counter -= 1
-        unit.add_parent_units(units)
+    def build_unit(self, node: LayoutUnit) -> FamilyUnit:
+        unit: FamilyUnit = self.unit_pool.acquire(node)
+        self.units_graph.append(unit)
+        unit.add_parent_units([self.build_unit(parent) for parent in node.parents])
         return unit
     
-    def draw_unit(self, unit: FamilyUnit, parent_offset_x: int):
-        parents_width = 0
-        offset_x = parent_offset_x
-        unit.align(unit.get_width(with_parents=True))
-
-        for par_unit in unit.parents_units:
-            self.y_offset -= self.GEN_OFFSET
-            par_unit.setPos(parent_offset_x, self.y_offset)
-            self.draw_unit(par_unit,parent_offset_x)
-            self.y_offset += self.GEN_OFFSET
-            parent_offset_x += par_unit.get_width(with_parents=True) + MARGIN_UNITS
-            parents_width += par_unit.get_width(with_parents=True)
-        
-        parents_width += (len(unit.parents_units) - 1) * MARGIN_UNITS if len(unit.parents_units) > 0 else 0
-        
-        if parents_width < unit.get_width(with_parents=True):
-            parent_offset_x = offset_x + (unit.get_width(with_parents=True) - parents_width) / 2
-            for parent_unit in unit.parents_units:
-                parent_unit.setPos(parent_offset_x, parent_unit.y())
-                parent_offset_x += parent_unit.get_width(with_parents=True) + MARGIN_UNITS
-        
-        for par_unit in unit.parents_units:
-            par_unit.draw_heads_connection()
+    @profiling.timed()
+    def draw_units(self):
+        for unit in self.units_graph:
+            unit.apply_layout()
+            unit.show_repeat_marker(self.REPEAT_MARKER if self.mark_repeats and unit.node.repeat_of else None, above=True)
+            unit.show_expand_buttons(self.expander(unit.node) if self.expand_callback else None)
+        with profiling.span("draw_heads_connection"):
+            for unit in self.units_graph:
+                unit.draw_heads_connection()
     
+    def expander(self, node: LayoutUnit):
+        return lambda: self.expand_callback(node.key)
+
     def get_width(self):
-        return self.ref_unit.get_width(with_parents=True)
+        return self.ref_unit.node.width
     
     def get_height(self):
         return self.max_gen_num * GraphPerson.HEIGHT + (self.max_gen_num) * MARGIN_UNITS
@@ -180,7 +176,9 @@ import sys
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     
-    branches = FamilyRoots(people[-1], people)
+    ref_node = build_ancestors(people[-1], FamilyGraph(people))
+    layout_ancestors(ref_node)
+    branches = FamilyRoots(ref_node, lambda arg: print(arg))
     
     scene = QGraphicsScene(0, 0, 1600, 600)
     view = QGraphicsView(scene)
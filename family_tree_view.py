@@ -1,159 +1,298 @@
-from typing import List
+from contextlib import contextmanager
+from typing import List, Optional, Set
 from PySide6.QtWidgets import (
     QApplication, QWidget, QListWidget, QLineEdit, QTextEdit,
     QPushButton, QFileDialog, QLabel, QHBoxLayout, QVBoxLayout,
     QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsTextItem,
-    QMessageBox, QComboBox
+    QMessageBox, QComboBox, QGraphicsItem
 )
-from PySide6.QtGui import QPen, QBrush, QImage, QPainter
-from PySide6.QtCore import Qt
-from family_unit import MARGIN, FamilyUnit, get_x_offset
+from PySide6.QtGui import QPen, QBrush, QImage, QPainter, QPixmapCache
+from PySide6.QtCore import Qt, Signal, QThreadPool
+from family_unit import FamilyUnit
+from graph_person import GraphPerson, DETAILS_LOD
+from photo_thumbnails import thumbnail_cache
 from family_branches import FamilyBranches
 from family_roots import FamilyRoots
 
 from person import Person
+from family_graph import FamilyGraph
+from tree_layout import DEFAULT_DEPTH, TreePlan, plan_tree
+from tree_planner import TreePlanTask
+from image_export import export_image, export_jpeg
+import profiling
+
+# the boxes are cached as pixmaps, the default 10 MB holds fewer boxes than a
+# large window shows
+PIXMAP_CACHE_KB: int = 64 * 1024
+
+class TreeGraphicsView(QGraphicsView):
+    """Graphics view with ctrl + wheel zoom that reports every change of the visible area."""
+    viewport_changed = Signal()
+    ZOOM_STEP: float = 1.25
+    MIN_SCALE: float = 0.02
+    MAX_SCALE: float = 4
+
+    def wheelEvent(self, event):
+        if not event.modifiers() & Qt.ControlModifier:
+            super().wheelEvent(event)
+            return
+        factor = self.ZOOM_STEP if event.angleDelta().y() > 0 else 1 / self.ZOOM_STEP
+        scale = self.transform().m11() * factor
+        if self.MIN_SCALE <= scale <= self.MAX_SCALE:
+            self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+            self.scale(factor, factor)
+            self.viewport_changed.emit()
+
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.viewport_changed.emit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.viewport_changed.emit()
 
 class FamilyTreeView(QVBoxLayout):
-    def __init__(self, click_callback):
+    # message of the error that stopped an asynchronous drawing
+    draw_failed = Signal(str)
+    # part of the viewport size added on each side when looking for boxes to fill in
+    VIEWPORT_MARGIN: float = 0.5
+
+    def __init__(self, click_callback, virtualized: bool = False, mark_repeats: bool = True, depth: Optional[int] = DEFAULT_DEPTH, asynchronous: bool = False):
+        """In virtualized mode the text of the boxes is created only for boxes
+        in or near the visible part of the scene and only when it is readable.
+        mark_repeats labels couples that appear a second time in the tree.
+        depth limits the generations drawn each way, units at the limit get a
+        button drawing depth more generations beyond them. None draws all.
+        In asynchronous mode redraws are built and laid out on a worker thread,
+        a newer request cancels the one in progress and errors are reported
+        through draw_failed.
+        """
         super().__init__()
 
         self.scene = QGraphicsScene(self)
-        self.graph_view = QGraphicsView(self.scene)
+        self.graph_view = TreeGraphicsView(self.scene)
         self.graph_view.setMinimumWidth(600)
         self.click_callback = click_callback
+        self.virtualized = virtualized
+        self.mark_repeats = mark_repeats
+        self.depth = depth
+        # keys of the units expanded past the depth limit
+        self.expanded: Set[tuple] = set()
+        self.asynchronous = asynchronous
+        # bumped for every asynchronous request, older results are dropped
+        self.plan_generation: int = 0
+        self.plan_task: TreePlanTask = None
+        # layouts started so far, lets tests check that an action lays the tree out once
+        self.layouts: int = 0
+        if virtualized:
+            self.graph_view.viewport_changed.connect(self.build_visible_details)
 
         self.addWidget(self.graph_view)
+        if QPixmapCache.cacheLimit() < PIXMAP_CACHE_KB:
+            QPixmapCache.setCacheLimit(PIXMAP_CACHE_KB)
 
-        self.people: List[Person] = []
+        self.graph: FamilyGraph = FamilyGraph()
         self.ref_people: List[Person] = []
+        self.roots: FamilyRoots = None
+        self.branches: List[FamilyBranches] = []
+        self.highlighted: GraphPerson = None
     
-    def set_people(self, people: List[Person]):
-        self.people = people
-        self.draw_tree()
+    def set_people(self, graph: FamilyGraph):
+        if graph is not self.graph:
+            self.expanded.clear()
+        self.graph = graph
+        # people may have been edited, so nothing drawn so far can be reused
+        self.scene.clear()
+        self.roots = None
+        self.branches = []
+        self.highlighted = None
+        self.redraw()
     
     def make_siblings(self):
         pass
     
-    def erase_unit_with_children_from_graph(self, ref_unit: FamilyUnit):
-        ref_unit.setVisible(False)
-        for child_unit in ref_unit.children_units:
-            self.erase_unit_with_children_from_graph(child_unit)
-    
-    def highlight_unit_or_child_unit(self, ref_unit: FamilyUnit, id: int):
+    def highlight_unit_or_child_unit(self, ref_unit: FamilyUnit, id: int) -> GraphPerson:
         try:
             highlight_graph = next(x for x in ref_unit.head_graph if x.person.id == id)
             highlight_graph.highlight()
             highlight_graph.update()
-        except:
+            return highlight_graph
+        except StopIteration:
             for child_unit in ref_unit.children_units:
-                self.highlight_unit_or_child_unit(child_unit, id)
+                highlight_graph = self.highlight_unit_or_child_unit(child_unit, id)
+                if highlight_graph:
+                    return highlight_graph
+        return None
+
+    def redraw(self):
+        if self.asynchronous and self.graph.concurrent_reads:
+            self.draw_tree_async()
+        else:
+            self.draw_tree()
+
+    def resolve_ref(self) -> bool:
+        """Looks the reference person up in the current graph, returns False
+        and clears the scene if there is nobody to draw.
+        """
+        if not self.graph:
+            self.cancel_plan()
+            self.scene.clear()
+            self.roots = None
+            self.branches = []
+            self.highlighted = None
+            return False
+        ref_person = self.graph.get(self.ref_people[0].id) if self.ref_people else None
+        self.ref_people.clear()
+        self.ref_people.append(ref_person or next(iter(self.graph)))
+        return True
 
     def draw_tree(self):
-        self.scene.clear()
-        if not self.people:
+        """Lays out the tree of the reference person right away. Items of the
+        previous drawing are moved, restyled or hidden rather than created again.
+        Raises AncestryCycleError, leaving the previous drawing, if the
+        person's tree has no end.
+        """
+        self.cancel_plan()
+        if not self.resolve_ref():
+            return
+        self.layouts += 1
+        self.apply_plan(plan_tree(self.graph, self.ref_people[0], self.depth, self.expanded))
+
+    def draw_tree_async(self):
+        """Starts building and laying out the tree on a worker thread, the
+        items are updated once the plan is ready.
+        """
+        self.cancel_plan()
+        if not self.resolve_ref():
+            return
+        self.plan_generation += 1
+        self.layouts += 1
+        self.plan_task = TreePlanTask(self.graph, self.ref_people[0], self.plan_generation, self.depth, self.expanded)
+        self.plan_task.signals.finished.connect(self.on_plan_ready)
+        self.plan_task.signals.failed.connect(self.on_plan_failed)
+        QThreadPool.globalInstance().start(self.plan_task)
+
+    def cancel_plan(self):
+        if self.plan_task:
+            self.plan_task.cancel()
+            self.plan_task = None
+
+    def finish_pending(self):
+        """Draws synchronously in place of a plan still being built."""
+        if self.plan_task:
+            self.draw_tree()
+
+    def on_plan_ready(self, generation: int, plan: TreePlan):
+        if generation != self.plan_generation or not self.plan_task:
+            return
+        self.plan_task = None
+        self.apply_plan(plan)
+
+    def on_plan_failed(self, generation: int, message: str):
+        if generation != self.plan_generation or not self.plan_task:
             return
-        if not self.ref_people:
-            self.ref_people.append(self.people[0])
-        
-        draw_reference: Person = self.ref_people[0]
-        ref_person: Person = self.ref_people[0]
-        
-        roots = FamilyRoots(draw_reference, self.people, self.click_callback)
-        ref_unit = roots.ref_unit
-        while len(ref_unit.parents_units) == 1:
-            ref_unit = ref_unit.parents_units[0]
-            roots.max_gen_num -= 1 
-        
-        draw_reference = ref_unit.unit_head[0]
-        if draw_reference != ref_person:
-            self.erase_unit_with_children_from_graph(ref_unit)
-
-        if len(ref_unit.parents_units) == 0:
-            roots.setVisible(False)
-
-        left_branch: FamilyBranches = None
-        right_branch: FamilyBranches = None
-        left_ref_unit: FamilyUnit = None
-        if len(ref_unit.parents_units) >= 2:
-            self.erase_unit_with_children_from_graph(ref_unit.parents_units[0])
-            self.erase_unit_with_children_from_graph(ref_unit.parents_units[1])
-
-            left_siblings_person_id = ref_unit.unit_head[0].id
-            right_siblings_person_id = ref_unit.unit_head[1].id
-
-            left_branch = FamilyBranches(ref_unit.parents_units[0].unit_head[0], self.people, self.click_callback, move_child_right=left_siblings_person_id)
-            right_branch = FamilyBranches(ref_unit.parents_units[1].unit_head[0], self.people, self.click_callback, move_child_left=right_siblings_person_id)
-
-            # align y
-            head_offset_y: int = ref_unit.parents_units[0].y() - left_branch.ref_unit.y()
-            left_branch.setPos(left_branch.x(), left_branch.y() + head_offset_y + MARGIN)
-            right_branch.setPos(right_branch.x(), right_branch.y() + head_offset_y + MARGIN)
-            
-            left_ref_unit = next(x for x in left_branch.ref_unit.children_units if ref_unit.unit_head[0] in x.unit_head)
-
-            #align branches to POI children
-            ref_x_offset = get_x_offset(0,ref_unit.head_graph[0])
-            left_branch_x_offset = ref_x_offset - get_x_offset(0,next(x for x in left_branch.ref_unit.children_units if ref_unit.unit_head[0] in x.unit_head).head_graph[0])
-            right_branch_x_offset = ref_x_offset - get_x_offset(0,next(x for x in right_branch.ref_unit.children_units if ref_unit.unit_head[1] in x.unit_head).head_graph[0])
-
-            left_branch.setPos(left_branch.x() + left_branch_x_offset, left_branch.y())
-            right_branch.setPos(right_branch.x() + right_branch_x_offset, right_branch.y())
+        self.plan_task = None
+        self.draw_failed.emit(message)
+
+    @profiling.timed()
+    def apply_plan(self, plan: TreePlan):
+        if self.highlighted:
+            self.highlighted.unhighlight()
+            self.highlighted = None
+
+        if self.roots:
+            self.roots.set_layout(plan.roots.root)
         else:
-            left_branch = FamilyBranches(draw_reference, self.people, self.click_callback)
-            left_ref_unit = left_branch.ref_unit
-        
-        sibling_ref_offset_x = get_x_offset(0, left_ref_unit.head_graph[0])
-        root_ref_offset_x = get_x_offset(0, ref_unit.head_graph[0])
-
-        root_x_trans = sibling_ref_offset_x - root_ref_offset_x if sibling_ref_offset_x > root_ref_offset_x else 0
-        branch_x_trans = root_ref_offset_x - sibling_ref_offset_x if sibling_ref_offset_x < root_ref_offset_x else 0
-
-        #align graphs
-        roots.setPos(MARGIN + root_x_trans, MARGIN)
-        if left_branch:
-            left_branch.setPos(MARGIN + branch_x_trans + left_branch.x(), left_branch.y())
-        if right_branch:
-            right_branch.setPos(MARGIN + branch_x_trans + right_branch.x(), right_branch.y())
-
-        # #align branches heads
-        if left_branch and right_branch:
-            left_x_offset = get_x_offset(0,ref_unit.parents_units[0].head_graph[0]) - get_x_offset(0,left_branch.ref_unit.head_graph[0])
-            left_branch.ref_unit.setPos(left_x_offset + left_branch.ref_unit.x(), left_branch.ref_unit.y())
-            left_branch.ref_unit.draw_heads_connection()
-            
-            right_x_offset = get_x_offset(0,ref_unit.parents_units[1].head_graph[0]) - get_x_offset(0,right_branch.ref_unit.head_graph[0])
-            right_branch.ref_unit.setPos(right_x_offset + right_branch.ref_unit.x(), right_branch.ref_unit.y())
-            right_branch.ref_unit.draw_heads_connection()
-
-            right_ref_unit = next(x for x in right_branch.ref_unit.children_units if ref_unit.unit_head[0] in x.unit_head)
-            self.erase_unit_with_children_from_graph(right_ref_unit)
-
-        self.highlight_unit_or_child_unit(left_branch.ref_unit, ref_person.id)
-
-        if left_branch:
-            self.scene.addItem(left_branch)
-        if right_branch:
-            self.scene.addItem(right_branch)
-        self.scene.addItem(roots)
-
-        self.scene.update()
-
-    def export_to_jpeg(self, path: str):
-        rect = self.scene.itemsBoundingRect()
-        image = QImage(
-            int(rect.width()) + 20,
-            int(rect.height()) + 20,
-            QImage.Format_ARGB32
+            self.roots = FamilyRoots(plan.roots.root, self.click_callback, lazy_details=self.virtualized, mark_repeats=self.mark_repeats, expand_callback=self.expand_callback())
+        self.roots.setPos(plan.roots.x, plan.roots.y)
+        self.roots.setVisible(plan.roots.visible)
+
+        for i, placed in enumerate(plan.branches):
+            if i < len(self.branches):
+                self.branches[i].set_layout(placed.root)
+            else:
+                self.branches.append(FamilyBranches(placed.root, self.click_callback, lazy_details=self.virtualized, mark_repeats=self.mark_repeats, expand_callback=self.expand_callback()))
+                self.scene.addItem(self.branches[i])
+            self.branches[i].setPos(placed.x, placed.y)
+            self.branches[i].setVisible(True)
+        for branch in self.branches[len(plan.branches):]:
+            branch.setVisible(False)
+
+        # the roots are drawn over the branches
+        if not self.roots.scene():
+            self.scene.addItem(self.roots)
+        self.roots.setZValue(1)
+
+        self.highlighted = self.highlight_unit_or_child_unit(self.branches[0].ref_unit, plan.ref_person.id)
+
+        if self.virtualized:
+            self.build_visible_details()
+        with profiling.span("scene.update"):
+            self.scene.update()
+
+    @profiling.timed()
+    def build_visible_details(self):
+        if self.graph_view.transform().m11() < DETAILS_LOD:
+            return
+        viewport = self.graph_view.viewport().rect()
+        rect = self.graph_view.mapToScene(viewport).boundingRect()
+        rect.adjust(
+            -rect.width() * self.VIEWPORT_MARGIN, -rect.height() * self.VIEWPORT_MARGIN,
+            rect.width() * self.VIEWPORT_MARGIN, rect.height() * self.VIEWPORT_MARGIN
         )
-        image.fill(Qt.white)
+        for item in self.scene.items(rect):
+            if isinstance(item, GraphPerson) and not item.details_built:
+                item.build_details()
 
-        painter = QPainter(image)
-        self.scene.render(painter)
-        painter.end()
+    def build_all_details(self):
+        for item in self.scene.items():
+            if isinstance(item, GraphPerson) and not item.details_built:
+                item.build_details()
 
-        image.save(path, "JPEG")
+    @contextmanager
+    def export_boxes(self):
+        """Paints the boxes directly for an export, which draws each of them
+        once at its own scale, rather than through pixmaps that would only
+        push the ones of the view out of the cache. Every photo is loaded
+        first and kept in memory until the export is written.
+        """
+        boxes = [item for item in self.scene.items() if isinstance(item, GraphPerson)]
+        photos = {box.person.photo_source for box in boxes if box.person.photo_source}
+        for box in boxes:
+            box.setCacheMode(QGraphicsItem.NoCache)
+        try:
+            with thumbnail_cache().kept(photos):
+                yield
+        finally:
+            for box in boxes:
+                box.setCacheMode(GraphPerson.CACHE_MODE)
 
-    def select_ref(self, person_a: Person):
+    def export_to_jpeg(self, path: str, scale: float = 1.0):
+        self.finish_pending()
+        self.build_all_details()
+        with profiling.span("export"), self.export_boxes():
+            export_jpeg(self.scene, path, scale)
+
+    def export_image(self, path: str, scale: float = 1.0):
+        """Exports PNG or JPEG by extension, PNG is rendered and written in tiles."""
+        self.finish_pending()
+        self.build_all_details()
+        with profiling.span("export"), self.export_boxes():
+            export_image(self.scene, path, scale)
+
+    def expand_callback(self):
+        return self.expand if self.depth is not None else None
+
+    def expand(self, key: tuple):
+        """Draws depth more generations beyond the unit with the given key."""
+        self.expanded.add(key)
+        self.redraw()
+
+    def set_ref(self, person_a: Person):
+        """Changes the reference person without drawing, for a redraw that follows."""
         self.ref_people.clear()
         self.ref_people.append(person_a)
-        self.draw_tree()
\ No newline at end of file
+
+    def select_ref(self, person_a: Person):
+        self.set_ref(person_a)
+        self.redraw()
\ No newline at end of file
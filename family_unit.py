@@ -1,48 +1,62 @@
-from typing import List
+from typing import Dict, List, Optional
 from person import Person
 from graph_person import GraphPerson
+from tree_layout import LayoutUnit, MARGIN, MARGIN_UNITS
+import profiling
 from PySide6.QtWidgets import (
     QApplication, QWidget, QListWidget, QLineEdit, QTextEdit,
     QPushButton, QFileDialog, QLabel, QHBoxLayout, QVBoxLayout,
     QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsTextItem,
     QMessageBox, QComboBox, QListWidgetItem, QFrame, QGraphicsItem, QGraphicsEllipseItem,
-    QGraphicsLineItem
+    QGraphicsLineItem, QGraphicsSimpleTextItem, QGraphicsPathItem
 )
-from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter
+from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter, QPainterPath
 from PySide6.QtCore import QRectF, Qt, QLine
 
-MARGIN: int = 20
-MARGIN_UNITS: int = 80
+class ExpandButton(QGraphicsEllipseItem):
+    """Round "+" button on a unit at the edge of a depth limited tree."""
+    SIZE: int = 18
 
-def get_x_offset(x_offset: int, item: QGraphicsItem):
-    parent = item
-    while parent:
-        x_offset += parent.x()
-        parent = parent.parentItem()
-    return x_offset
+    def __init__(self, parent: QGraphicsItem):
+        super().__init__(0, 0, self.SIZE, self.SIZE, parent)
+        self.callback = None
+        self.setBrush(QBrush(QColor("#F7F1DE")))
+        self.setPen(QPen(QColor("#4B352A"), 2))
+        self.setCursor(Qt.PointingHandCursor)
+        self.setToolTip("Show more generations")
+        pen = QPen(QColor("#4B352A"), 2)
+        middle = self.SIZE / 2
+        QGraphicsLineItem(middle, 4, middle, self.SIZE - 4, self).setPen(pen)
+        QGraphicsLineItem(4, middle, self.SIZE - 4, middle, self).setPen(pen)
+
+    def mousePressEvent(self, event):
+        event.accept()
+        if self.callback:
+            self.callback()
 
 class FamilyUnit(QGraphicsItem):
 
-    def __init__(self, person: Person, people: List[Person], parent, click_callback):
+    def __init__(self, node: LayoutUnit, parent, click_callback, lazy_details: bool = False):
         super().__init__(parent)
-        self.unit_head: List[Person] = []
-        self.unit_head.append(person)
-        for per in people:
-            if per.id in person.partners:
-                self.unit_head.append(per)
+        self.node = node
+        self.unit_head: List[Person] = node.heads
 
-        self.segments = []
-        
-        self.unit_head.sort(key= lambda person: person.id)
+        # one path item with every line of the unit, and the lines it was built from
+        self.connector: QGraphicsPathItem = None
+        self.connector_lines = []
         
         self.head_graph: List[GraphPerson] = []
         for head in self.unit_head:
-            self.head_graph.append(GraphPerson(head, self, click_callback))
+            self.head_graph.append(GraphPerson(head, self, click_callback, lazy_details))
+        profiling.count("items created", 1 + len(self.head_graph))
 
         self.children_units: List["FamilyUnit"] = []
         self.parents_units: List["FamilyUnit"] = []
         self.display_width = 0
         self.x_offset = 0
+        self.repeat_marker: QGraphicsSimpleTextItem = None
+        # keyed by True for the button above the heads, False for the one below
+        self.expand_buttons: Dict[bool, ExpandButton] = {}
     
     def add_children_units(self, units: List["FamilyUnit"], update_parent: bool = True):
         self.children_units += units
@@ -56,8 +70,23 @@ class FamilyUnit(QGraphicsItem):
             for unit in self.parents_units:
                 unit.add_children_units([self],False)
 
+    def set_node(self, node: LayoutUnit):
+        """Reuses this unit for a newly laid out node with the same heads."""
+        self.node = node
+        self.unit_head = node.heads
+        for head, person in zip(self.head_graph, self.unit_head):
+            head.set_person(person)
+        self.children_units = []
+        self.parents_units = []
+
+    def apply_layout(self):
+        self.setPos(self.node.x, self.node.y)
+        self.align(self.node.width)
+        self.setVisible(self.node.visible)
+
     def align(self, width):
         head_count = len(self.head_graph)
+        self.prepareGeometryChange()
         self.x_offset = (width - (head_count * GraphPerson.WIDTH + (head_count - 1) * MARGIN))/2
         i=0
         for head in self.head_graph:
@@ -66,71 +95,100 @@ class FamilyUnit(QGraphicsItem):
         self.display_width = i * (GraphPerson.WIDTH) + (i - 1) * MARGIN
 
     def get_width(self, with_parents = False, with_children = False):
-        children_width = 0
-        if with_children:
-            for unit in self.children_units:
-                children_width += unit.get_width(False,with_children)
-            if len(self.children_units) > 0:
-                children_width += (len(self.children_units) - 1) * MARGIN_UNITS
-    
-        parents_width = 0
-        if with_parents:
-            for unit in self.parents_units:
-                parents_width += unit.get_width(with_parents,False)
-            if len(self.parents_units) > 0:
-                parents_width += (len(self.parents_units) - 1) * MARGIN_UNITS
-
-        width = 0
-        if len(self.unit_head) > 0:
-            width += (len(self.unit_head) - 1) * MARGIN
-            width += len(self.unit_head) * GraphPerson.WIDTH
-        
-        return max(children_width, parents_width, width)
+        return self.node.get_width(with_parents, with_children)
+
+    def show_repeat_marker(self, text: Optional[str], above: bool):
+        """Labels a couple already drawn elsewhere in the tree, None hides the label."""
+        if text is None:
+            if self.repeat_marker:
+                self.repeat_marker.setVisible(False)
+            return
+        if not self.repeat_marker:
+            self.repeat_marker = QGraphicsSimpleTextItem(self)
+            self.repeat_marker.setBrush(QColor("#4B352A"))
+        self.repeat_marker.setText(text)
+        height = self.repeat_marker.boundingRect().height()
+        y = -height - MARGIN / 4 if above else GraphPerson.HEIGHT + MARGIN / 4
+        self.repeat_marker.setPos(self.x_offset, y)
+        self.repeat_marker.setVisible(True)
+
+    def show_expand_buttons(self, callback):
+        """Shows a button calling callback above the heads if the node has more
+        generations of parents and below if it has more of children.
+        None hides the buttons.
+        """
+        for above, more in ((True, self.node.more_parents), (False, self.node.more_children)):
+            button = self.expand_buttons.get(above)
+            if callback is None or not more:
+                if button:
+                    button.setVisible(False)
+                continue
+            if not button:
+                button = self.expand_buttons[above] = ExpandButton(self)
+            button.callback = callback
+            x = self.x_offset + (self.display_width - ExpandButton.SIZE) / 2
+            # below the heads it goes under the line joining the couple
+            y = -ExpandButton.SIZE - MARGIN / 4 if above else GraphPerson.HEIGHT + MARGIN_UNITS / 4 + MARGIN / 4
+            button.setPos(x, y)
+            button.setVisible(True)
 
     def draw_heads_connection(self):
-        for segment in self.segments:
-            segment.setVisible(False)
-        self.segments.clear()
+        """Draws the lines joining the couple and leading down to each child
+        unit as a single path item, computed from the layout of this unit and
+        its children. The path is only rebuilt when the lines change.
+        """
+        node = self.node
+        lines = []
         mid_point_x = None
-        if len(self.head_graph) > 1:
-            # Define pen style (color, width)
-
-            vert_y: int = int(self.head_graph[0].y() + GraphPerson.HEIGHT + MARGIN_UNITS/4)
-            vert_x1: int = int(self.head_graph[0].x() + GraphPerson.WIDTH/2)
-            vert_x2: int = int(self.head_graph[1].x() + GraphPerson.WIDTH/2)
+        vert_y: int = int(GraphPerson.HEIGHT + MARGIN_UNITS/4)
+        if len(self.unit_head) > 1:
+            vert_x1: int = int(node.heads_x + GraphPerson.WIDTH/2)
+            vert_x2: int = int(node.heads_x + GraphPerson.WIDTH + MARGIN + GraphPerson.WIDTH/2)
             mid_point_x = (vert_x1 + vert_x2) / 2
-            self.segments += [
-                QGraphicsLineItem(vert_x1, vert_y - MARGIN_UNITS/4, vert_x1, vert_y,self),
-                QGraphicsLineItem(vert_x2, vert_y - MARGIN_UNITS/4, vert_x2, vert_y,self),
-                QGraphicsLineItem(vert_x1, vert_y, vert_x2, vert_y,self),
+            lines += [
+                (vert_x1, vert_y - MARGIN_UNITS/4, vert_x1, vert_y),
+                (vert_x2, vert_y - MARGIN_UNITS/4, vert_x2, vert_y),
+                (vert_x1, vert_y, vert_x2, vert_y),
             ]
-        elif len(self.head_graph) == 1:
-            vert_y: int = int(self.head_graph[0].y() + GraphPerson.HEIGHT + MARGIN_UNITS/4)
-            mid_point_x = int(self.head_graph[0].x() + GraphPerson.WIDTH/2)
+        elif len(self.unit_head) == 1:
+            mid_point_x = int(node.heads_x + GraphPerson.WIDTH/2)
             if len(self.children_units)>0:
-                self.segments.append(QGraphicsLineItem(mid_point_x, vert_y - MARGIN_UNITS/4, mid_point_x, vert_y,self))
+                lines.append((mid_point_x, vert_y - MARGIN_UNITS/4, mid_point_x, vert_y))
 
         if len(self.children_units)>0 and mid_point_x:
             start_point_x = mid_point_x
             start_point_y = vert_y + MARGIN_UNITS/2
-            self.segments.append(QGraphicsLineItem(start_point_x, vert_y, start_point_x, start_point_y,self))
-            children = []
+            end_point_y = start_point_y + MARGIN_UNITS/4
+            lines.append((start_point_x, vert_y, start_point_x, start_point_y))
+            children = set()
             for head in self.unit_head:
-                children += [x for x in head.kids if not x in children]
+                children.update(head.kids)
             for unit in self.children_units:
-                kid: GraphPerson = next(x for x in unit.head_graph if x.person.id in children)
-                if kid:
-                    mid_offest = get_x_offset(start_point_x, self)
-                    kid_offest = get_x_offset(GraphPerson.WIDTH / 2, kid)
-                    x_offset = mid_offest - kid_offest
-                    end_point_x = start_point_x - x_offset 
-                    end_point_y = start_point_y + MARGIN_UNITS/4
-                    self.segments.append(QGraphicsLineItem(start_point_x, start_point_y, end_point_x, start_point_y,self))
-                    self.segments.append(QGraphicsLineItem(end_point_x, start_point_y, end_point_x, end_point_y,self))
-
-        pen = QPen(Qt.black, 3)
-        for segment in self.segments:
-            segment.setPen(pen)
+                index = next((i for i, x in enumerate(unit.unit_head) if x.id in children), None)
+                if index is not None:
+                    # all units of a tree share its coordinates
+                    end_point_x = unit.node.head_x(index) + GraphPerson.WIDTH/2 - node.x
+                    lines.append((start_point_x, start_point_y, end_point_x, start_point_y))
+                    lines.append((end_point_x, start_point_y, end_point_x, end_point_y))
+
+        # a child right under the parents gives a zero-length segment
+        lines = [line for line in lines if line[0] != line[2] or line[1] != line[3]]
+        if not lines:
+            if self.connector:
+                self.connector.setVisible(False)
+            return
+        if not self.connector:
+            self.connector = QGraphicsPathItem(self)
+            self.connector.setPen(QPen(Qt.black, 3))
+            profiling.count("items created")
+        if lines != self.connector_lines:
+            self.connector_lines = lines
+            path = QPainterPath()
+            for x1, y1, x2, y2 in lines:
+                path.moveTo(x1, y1)
+                path.lineTo(x2, y2)
+            self.connector.setPath(path)
+        self.connector.setVisible(True)
 
     def trace(self):
         names: str = "head: "
@@ -146,4 +204,49 @@ class FamilyUnit(QGraphicsItem):
 
     def paint(self, painter, option, widget):
         # Optional: Add connectors or debug frames here
-        pass
\ No newline at end of file
+        pass
+
+class UnitPool:
+    """FamilyUnit items of one tree keyed by their heads. Laying out the tree
+    again takes the units from here, so only units that were not shown before
+    are created and the ones no longer shown are hidden.
+    """
+
+    def __init__(self, parent: QGraphicsItem, click_callback, lazy_details: bool = False):
+        self.parent = parent
+        self.click_callback = click_callback
+        self.lazy_details = lazy_details
+        self.units: Dict[tuple, List[FamilyUnit]] = {}
+        self.free: Dict[tuple, List[FamilyUnit]] = {}
+
+    def begin(self):
+        self.free = {key: list(units) for key, units in self.units.items()}
+
+    def acquire(self, node: LayoutUnit) -> FamilyUnit:
+        free = self.free.get(node.key)
+        if free:
+            unit = free.pop()
+            unit.set_node(node)
+            return unit
+        unit = FamilyUnit(node, self.parent, self.click_callback, self.lazy_details)
+        self.units.setdefault(node.key, []).append(unit)
+        return unit
+
+    def end(self):
+        unused: List[FamilyUnit] = [unit for units in self.free.values() for unit in units]
+        self.free = {}
+        kept = sum(len(units) for units in self.units.values()) - len(unused)
+        if len(unused) <= kept:
+            for unit in unused:
+                unit.setVisible(False)
+            return
+        # the tree shrank a lot, drop the leftovers instead of keeping them hidden
+        for unit in unused:
+            key = unit.node.key
+            self.units[key].remove(unit)
+            if not self.units[key]:
+                del self.units[key]
+            if unit.scene():
+                unit.scene().removeItem(unit)
+            else:
+                unit.setParentItem(None)
@@ -0,0 +1,59 @@
+from typing import List
+from PySide6.QtCore import QObject, QRunnable, Signal
+from person import Person
+from family_graph import FamilyGraph
+from family_io import iter_people, replay_journal
+from people_index import PeopleIndex
+from integrity import Issue, check_graph
+import profiling
+
+class GraphLoaderSignals(QObject):
+    # bytes read, file size
+    progress = Signal(int, int)
+    # FamilyGraph
+    finished = Signal(object)
+    failed = Signal(str)
+
+class GraphLoadTask(QRunnable):
+    """Loads a family file on a QThreadPool thread and reports back through
+    signals, which Qt delivers on the GUI thread.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__()
+        self.filename = filename
+        self.cancelled = False
+        # search index of the loaded graph, built here so the GUI doesn't wait for it
+        self.index: PeopleIndex = None
+        # problems found in the relation lists of the loaded graph
+        self.issues: List[Issue] = []
+        self.signals = GraphLoaderSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            with profiling.span("load_graph"):
+                graph = FamilyGraph()
+                # people replaced by a later one with the same id
+                duplicates: List[Person] = []
+                for batch in iter_people(self.filename, progress=self.signals.progress.emit):
+                    if self.cancelled:
+                        return
+                    for person in batch:
+                        previous = graph.people.get(person.id)
+                        if previous is not None:
+                            duplicates.append(previous)
+                        graph.add(person)
+                replay_journal(self.filename, graph)
+            if self.cancelled:
+                return
+            with profiling.span("index_people"):
+                self.index = PeopleIndex(graph)
+            self.issues = check_graph(graph, duplicates)
+        except Exception as e:
+            self.signals.failed.emit(f"{self.filename}: {e}")
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(graph)
@@ -4,62 +4,137 @@ from PySide6.QtWidgets import (
     QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsTextItem,
     QMessageBox, QComboBox, QListWidgetItem, QFrame
 )
-from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter, QStaticText, QTextOption, QTransform
+from PySide6.QtCore import Qt, QPointF, QRectF
 from person import Person
+from tree_layout import PERSON_WIDTH, PERSON_HEIGHT
+from photo_thumbnails import thumbnail_cache
+import profiling
+
+# below these levels of detail the text is skipped, the box is drawn as a plain
+# rectangle and then as a dot
+DETAILS_LOD: float = 0.4
+DOT_LOD: float = 0.1
+
+# space QGraphicsTextItem kept around its text, the text is placed as it was
+TEXT_MARGIN: int = 4
+# photos sit at the left of the box, the text moves right of them
+PHOTO_SIZE: int = 56
+PHOTO_MARGIN: int = 6
+
+class BoxStyle:
+    """Fonts, colors, pens and brushes shared by every box, created once
+    the application exists.
+    """
+    def __init__(self):
+        self.name_font = QFont("Segoe UI", 10, QFont.Bold)
+        self.name_color = QColor("#2E6F40")
+        self.detail_font = QFont("Segoe UI", 8, QFont.Bold)
+        self.detail_color = QColor("#654321")
+        self.text_option = QTextOption(Qt.AlignHCenter)
+        self.text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        self.brush = QBrush(QColor("#F7F1DE"))
+        self.pen = QPen(QColor("#4B352A"), 2)
+        self.highlight_brush = QBrush(QColor("#D4BF79"))
+        self.highlight_pen = QPen(QColor("#4B352A"), 5)
+        # drawn while a photo loads or when it cannot be read
+        self.placeholder_brush = QBrush(QColor("#E9DFC4"))
+        self.placeholder_pen = QPen(QColor("#B9A57A"), 1)
+        self.silhouette_brush = QBrush(QColor("#CDBE98"))
+
+_style: BoxStyle = None
+
+def box_style() -> BoxStyle:
+    global _style
+    if _style is None:
+        _style = BoxStyle()
+    return _style
+
+def static_text(text: str, font: QFont, width: float) -> QStaticText:
+    """Plain text laid out once, centered in width and wrapped like the
+    text items drawn before.
+    """
+    static = QStaticText(text)
+    static.setTextFormat(Qt.PlainText)
+    static.setTextWidth(width - 2 * TEXT_MARGIN)
+    static.setTextOption(box_style().text_option)
+    static.prepare(QTransform(), font)
+    return static
 
 class GraphPerson(QGraphicsRectItem):
-    WIDTH = 150
-    HEIGHT = 80
+    WIDTH = PERSON_WIDTH
+    HEIGHT = PERSON_HEIGHT
+    # the box is painted into a pixmap once per zoom level, scrolling and
+    # repainting the scene only copies it
+    CACHE_MODE = QGraphicsRectItem.DeviceCoordinateCache
 
-    def __init__(self, person: Person, parent, click_callback = None):
+    def __init__(self, person: Person, parent, click_callback = None, lazy_details: bool = False):
+        """With lazy_details the text is laid out only once build_details is
+        called, which the tree view does for boxes close to its viewport.
+        """
         # Initialize with fixed dimensions
         super().__init__(0, 0, self.WIDTH, self.HEIGHT, parent)
         
         self.person = person
         self.click_callback = click_callback
+        self.details_built = False
+        # (position, font, color, text) drawn by paint
+        self.texts = []
+        # area of the text, which long names make run out of the box
+        self.text_bounds = QRectF()
         
         # 1. Aesthetics (Wood and Moss)
-        self.setBrush(QBrush(QColor("#F7F1DE"))) # Background
-        self.setPen(QPen(QColor("#4B352A"), 2))   # Border
-
-        # 2. Name Text (Bold Green)
-        family_name = ((" " + "(" + person.family_name + ")") if  not person.family_name in person.last_name else "")
-        self.name_item = QGraphicsTextItem(person.with_full_last_name, self)
-        self.name_item.setFont(QFont("Segoe UI", 10, QFont.Bold))
-        self.name_item.setDefaultTextColor(QColor("#2E6F40"))
-        self.name_item.setTextWidth(self.WIDTH)
-        
-        # Center alignment using QTextOption
-        name_opt = self.name_item.document().defaultTextOption()
-        name_opt.setAlignment(Qt.AlignHCenter)
-        self.name_item.document().setDefaultTextOption(name_opt)
-        self.name_item.setPos(0, 10)
+        style = box_style()
+        self.setBrush(style.brush) # Background
+        self.setPen(style.pen)   # Border
+        self.setCacheMode(self.CACHE_MODE)
+
+        if not lazy_details:
+            self.build_details()
+
+    def build_details(self):
+        if self.details_built:
+            return
+        self.details_built = True
+        self.layout_texts()
+
+    def layout_texts(self):
+        person = self.person
+        profiling.count("details built")
+        style = box_style()
+        left = PHOTO_MARGIN + PHOTO_SIZE if person.photo_source else 0
+        width = self.WIDTH - left
+        x = left + TEXT_MARGIN
+
+        # 2. Name Text (Bold Green), centered
+        texts = [(QPointF(x, 10 + TEXT_MARGIN), style.name_font, style.name_color, static_text(person.with_full_last_name, style.name_font, width))]
 
         # 3. Details Text (Brown)
         if person.birth_date:
-            detail_text = "* " + str(person.birth_date)
-            self.birth_item = QGraphicsTextItem(detail_text, self)
-            self.birth_item.setFont(QFont("Segoe UI", 8, QFont.Bold))
-            self.birth_item.setDefaultTextColor(QColor("#654321"))
-            self.birth_item.setTextWidth(self.WIDTH)
-            
-            detail_opt = self.birth_item.document().defaultTextOption()
-            detail_opt.setAlignment(Qt.AlignCenter)
-            self.birth_item.document().setDefaultTextOption(detail_opt)
-            self.birth_item.setPos(0, 43)
-        
+            texts.append((QPointF(x, 43 + TEXT_MARGIN), style.detail_font, style.detail_color, static_text("* " + str(person.birth_date), style.detail_font, width)))
         if person.death_date:
-            detail_text = "+ " + str(person.death_date)
-            self.death_item = QGraphicsTextItem(detail_text, self)
-            self.death_item.setFont(QFont("Segoe UI", 8, QFont.Bold))
-            self.death_item.setDefaultTextColor(QColor("#654321"))
-            self.death_item.setTextWidth(self.WIDTH)
-            
-            detail_opt = self.death_item.document().defaultTextOption()
-            detail_opt.setAlignment(Qt.AlignCenter)
-            self.death_item.document().setDefaultTextOption(detail_opt)
-            self.death_item.setPos(0, 55)
+            texts.append((QPointF(x, 55 + TEXT_MARGIN), style.detail_font, style.detail_color, static_text("+ " + str(person.death_date), style.detail_font, width)))
+        bounds = QRectF()
+        for position, _, _, text in texts:
+            bounds |= QRectF(left, position.y() - TEXT_MARGIN, width, text.size().height() + 2 * TEXT_MARGIN)
+        self.prepareGeometryChange()
+        self.texts = texts
+        self.text_bounds = bounds
+        # the cached pixmap still shows the old text
+        self.update()
+
+    def set_person(self, person: Person):
+        """Shows another person in a reused box."""
+        if person is self.person:
+            return
+        self.person = person
+        if self.details_built:
+            self.layout_texts()
+
+    def boundingRect(self):
+        # covers the text running out of the box, so the cached pixmap does
+        # not cut it off
+        return super().boundingRect() | self.text_bounds
     
     def mousePressEvent(self, event):
         
@@ -72,15 +147,57 @@ class GraphPerson(QGraphicsRectItem):
             pass
 
     def highlight(self):
-        self.setPen(QPen(QColor("#4B352A"), 5))   # Border
-        self.setBrush(QBrush(QColor("#D4BF79"))) # Background
+        style = box_style()
+        self.setPen(style.highlight_pen)   # Border
+        self.setBrush(style.highlight_brush) # Background
+
+    def unhighlight(self):
+        style = box_style()
+        self.setBrush(style.brush) # Background
+        self.setPen(style.pen)   # Border
 
     def paint(self, painter, option, widget):
         """Override to draw rounded corners as per original styling."""
-        painter.setRenderHint(QPainter.Antialiasing)
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < DOT_LOD:
+            painter.fillRect(self.rect(), self.pen().color())
+            return
         painter.setBrush(self.brush())
         painter.setPen(self.pen())
+        if lod < DETAILS_LOD:
+            painter.drawRect(self.rect())
+            return
+        painter.setRenderHint(QPainter.Antialiasing)
         painter.drawRoundedRect(self.rect(), 8, 8)
+        for position, font, color, text in self.texts:
+            painter.setFont(font)
+            painter.setPen(color)
+            painter.drawStaticText(position, text)
+        if self.person.photo_source and self.details_built:
+            self.paint_photo(painter)
+
+    def paint_photo(self, painter):
+        """Draws the thumbnail of the photo, or a placeholder until the
+        thumbnail cache has it, which then updates the box.
+        """
+        frame = QRectF(PHOTO_MARGIN, (self.HEIGHT - PHOTO_SIZE) / 2, PHOTO_SIZE, PHOTO_SIZE)
+        pixmap = thumbnail_cache().get(self.person.photo_source, self)
+        if pixmap is not None:
+            target = QRectF(QPointF(), pixmap.size().scaled(PHOTO_SIZE, PHOTO_SIZE, Qt.KeepAspectRatio))
+            target.moveCenter(frame.center())
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+            return
+        style = box_style()
+        painter.setPen(style.placeholder_pen)
+        painter.setBrush(style.placeholder_brush)
+        painter.drawRoundedRect(frame, 4, 4)
+        # head and shoulders
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(style.silhouette_brush)
+        size = PHOTO_SIZE
+        painter.drawEllipse(QRectF(frame.x() + size * 0.32, frame.y() + size * 0.16, size * 0.36, size * 0.36))
+        painter.drawChord(QRectF(frame.x() + size * 0.14, frame.y() + size * 0.58, size * 0.72, size * 0.7), 0, 180 * 16)
         
 import sys
 # --- Example Usage ---
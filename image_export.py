@@ -0,0 +1,93 @@
+import struct
+import zlib
+from PySide6.QtWidgets import QGraphicsScene
+from PySide6.QtGui import QImage, QPainter
+from PySide6.QtCore import QRectF, Qt
+
+# blank border around the drawn items, in scene units
+EXPORT_MARGIN: int = 10
+TILE_WIDTH: int = 1024
+BAND_HEIGHT: int = 128
+# Qt can only encode a JPEG from a whole image, larger exports have to be PNG
+MAX_JPEG_PIXELS: int = 100_000_000
+# longest side libjpeg can write
+MAX_JPEG_SIDE: int = 65500
+
+class PngStreamWriter:
+    """Writes an 8 bit RGB PNG row by row, compressing as it goes."""
+
+    def __init__(self, f, width: int, height: int):
+        self.f = f
+        self.compressor = zlib.compressobj(6)
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def write_chunk(self, kind: bytes, data: bytes):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_row(self, row: bytes):
+        # every row starts with its filter type, 0 = none
+        data = self.compressor.compress(b"\x00" + row)
+        if data:
+            self.write_chunk(b"IDAT", data)
+
+    def close(self):
+        self.write_chunk(b"IDAT", self.compressor.flush())
+        self.write_chunk(b"IEND", b"")
+
+def export_rect(scene: QGraphicsScene) -> QRectF:
+    return scene.itemsBoundingRect().adjusted(-EXPORT_MARGIN, -EXPORT_MARGIN, EXPORT_MARGIN, EXPORT_MARGIN)
+
+def render_tile(scene: QGraphicsScene, source: QRectF, width: int, height: int) -> QImage:
+    image = QImage(width, height, QImage.Format_RGB888)
+    image.fill(Qt.white)
+    painter = QPainter(image)
+    scene.render(painter, QRectF(0, 0, width, height), source, Qt.IgnoreAspectRatio)
+    painter.end()
+    return image
+
+def export_png(scene: QGraphicsScene, path: str, scale: float = 1.0, tile_width: int = TILE_WIDTH, band_height: int = BAND_HEIGHT):
+    """Renders the scene in tiles and streams them into a PNG file.
+    Only one band of rows across the image is held in memory at a time.
+    """
+    rect = export_rect(scene)
+    width = max(1, int(rect.width() * scale))
+    height = max(1, int(rect.height() * scale))
+
+    with open(path, "wb") as f:
+        writer = PngStreamWriter(f, width, height)
+        for top in range(0, height, band_height):
+            rows_count = min(band_height, height - top)
+            rows = [bytearray(width * 3) for _ in range(rows_count)]
+            for left in range(0, width, tile_width):
+                columns_count = min(tile_width, width - left)
+                source = QRectF(
+                    rect.x() + left / scale, rect.y() + top / scale,
+                    columns_count / scale, rows_count / scale
+                )
+                tile = render_tile(scene, source, columns_count, rows_count)
+                bits = tile.constBits()
+                line = tile.bytesPerLine()
+                for i, row in enumerate(rows):
+                    row[left * 3:(left + columns_count) * 3] = bits[i * line:i * line + columns_count * 3]
+            for row in rows:
+                writer.write_row(row)
+        writer.close()
+
+def export_jpeg(scene: QGraphicsScene, path: str, scale: float = 1.0):
+    rect = export_rect(scene)
+    width = max(1, int(rect.width() * scale))
+    height = max(1, int(rect.height() * scale))
+    if width * height > MAX_JPEG_PIXELS or max(width, height) > MAX_JPEG_SIDE:
+        raise ValueError(f"{width}x{height} is too large for a JPEG export, use PNG or a smaller scale")
+    render_tile(scene, rect, width, height).save(path, "JPEG")
+
+def export_image(scene: QGraphicsScene, path: str, scale: float = 1.0):
+    """Exports the scene as PNG or JPEG depending on the file extension."""
+    if path.lower().endswith(".png"):
+        export_png(scene, path, scale)
+    else:
+        export_jpeg(scene, path, scale)
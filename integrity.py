@@ -0,0 +1,171 @@
+from dataclasses import dataclass, field, replace
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional
+from person import Person
+from family_graph import FamilyGraph
+import profiling
+
+RELATIONS = ("parents", "kids", "partners")
+# the list of the other person that has to hold the link back
+INVERSE = {"parents": "kids", "kids": "parents", "partners": "partners"}
+# getters of each relation list and of its inverse, for the check loop
+GETTERS = [(relation, attrgetter(relation), attrgetter(INVERSE[relation])) for relation in RELATIONS]
+
+DANGLING = "dangling"
+ONE_SIDED = "one-sided"
+SELF_LINK = "self-link"
+REPEATED = "repeated"
+DUPLICATE_ID = "duplicate id"
+CYCLE = "cycle"
+
+@dataclass
+class Issue:
+    """A problem in the relation lists of person_id. relation and other_id
+    name the offending entry, path lists the ids of an ancestry cycle and
+    person holds the person dropped for a duplicate id.
+    """
+    kind: str
+    person_id: int
+    relation: str = ""
+    other_id: Optional[int] = None
+    path: List[int] = field(default_factory=list)
+    person: Optional[Person] = None
+
+    def __str__(self) -> str:
+        if self.kind == CYCLE:
+            return "ancestry cycle " + " -> ".join(str(id) for id in self.path)
+        if self.kind == DUPLICATE_ID:
+            return f"{self.person_id}: id used twice, {self.person.search_name or '(Unnamed)'} was dropped"
+        if self.kind == ONE_SIDED:
+            return f"{self.person_id}: {self.other_id} is in {self.relation} but {self.person_id} is not in the {INVERSE[self.relation]} of {self.other_id}"
+        if self.kind == DANGLING:
+            return f"{self.person_id}: unknown id {self.other_id} in {self.relation}"
+        if self.kind == SELF_LINK:
+            return f"{self.person_id}: own id in {self.relation}"
+        return f"{self.person_id}: {self.other_id} more than once in {self.relation}"
+
+# =======================
+# CHECK
+# =======================
+
+@profiling.timed()
+def check_graph(graph: FamilyGraph, duplicates: Iterable[Person] = ()) -> List[Issue]:
+    """Finds broken relation lists in one pass over the people and their
+    links plus one depth first search for ancestry cycles. duplicates are the
+    people a load replaced with a later person of the same id.
+    """
+    issues: List[Issue] = [Issue(DUPLICATE_ID, person.id, person=person) for person in duplicates]
+    people = graph.people
+    for person in people.values():
+        id = person.id
+        for relation, get_ids, get_inverse in GETTERS:
+            ids = get_ids(person)
+            if not ids:
+                continue
+            if len(ids) > 1 and len(set(ids)) < len(ids):
+                seen = set()
+                for other_id in ids:
+                    if other_id in seen:
+                        issues.append(Issue(REPEATED, id, relation, other_id))
+                    seen.add(other_id)
+                # the other checks report a repeated link once
+                ids = dict.fromkeys(ids)
+            for other_id in ids:
+                other = people.get(other_id)
+                if other is None:
+                    issues.append(Issue(DANGLING, id, relation, other_id))
+                elif other_id == id:
+                    issues.append(Issue(SELF_LINK, id, relation, other_id))
+                elif id not in get_inverse(other):
+                    issues.append(Issue(ONE_SIDED, id, relation, other_id))
+    issues += find_cycles(graph)
+    return issues
+
+def find_cycles(graph: FamilyGraph) -> List[Issue]:
+    """One issue per parent link that closes an ancestry cycle, on the child."""
+    people = graph.people
+    parents = graph.parents
+    # 1 while on the current path, 2 once all ancestors are explored
+    state: Dict[int, int] = {}
+    issues: List[Issue] = []
+    for start in people:
+        if start in state:
+            continue
+        state[start] = 1
+        path = [start]
+        stack = [iter(parents.get(start, ()))]
+        while stack:
+            for parent_id in stack[-1]:
+                if parent_id == path[-1] or parent_id not in people:
+                    continue
+                seen = state.get(parent_id)
+                if seen is None:
+                    state[parent_id] = 1
+                    path.append(parent_id)
+                    stack.append(iter(parents.get(parent_id, ())))
+                    break
+                if seen == 1:
+                    cycle = path[path.index(parent_id):] + [parent_id]
+                    issues.append(Issue(CYCLE, path[-1], "parents", parent_id, cycle))
+            else:
+                state[path.pop()] = 2
+                stack.pop()
+    return issues
+
+def describe(issues: List[Issue], limit: int = 10) -> str:
+    """Counts of each kind of issue followed by the first few of them."""
+    counts: Dict[str, int] = {}
+    for issue in issues:
+        counts[issue.kind] = counts.get(issue.kind, 0) + 1
+    lines = [", ".join(f"{count} {kind}" for kind, count in counts.items())]
+    lines += [str(issue) for issue in issues[:limit]]
+    if len(issues) > limit:
+        lines.append(f"... and {len(issues) - limit} more")
+    return "\n".join(lines)
+
+# =======================
+# REPAIR
+# =======================
+
+def repair(graph: FamilyGraph, issues: List[Issue]) -> List[Person]:
+    """Fixes the issues through the graph, so listeners and the journal see
+    every change. Unknown ids, own ids and repeated entries are dropped,
+    one-sided links are completed on the other side, the link closing an
+    ancestry cycle is removed on both sides and people dropped for a
+    duplicate id come back under a new id without relations.
+    Returns the people changed or added.
+    """
+    changed: Dict[int, Person] = {}
+
+    def edited(id: int) -> Person:
+        person = changed[id] = graph.get(id)
+        return person
+
+    for issue in issues:
+        if issue.kind in (DANGLING, SELF_LINK):
+            ids = getattr(edited(issue.person_id), issue.relation)
+            while issue.other_id in ids:
+                ids.remove(issue.other_id)
+        elif issue.kind == REPEATED:
+            ids = getattr(edited(issue.person_id), issue.relation)
+            ids[:] = dict.fromkeys(ids)
+        elif issue.kind == ONE_SIDED:
+            ids = getattr(edited(issue.other_id), INVERSE[issue.relation])
+            if issue.person_id not in ids:
+                ids.append(issue.person_id)
+        elif issue.kind == CYCLE:
+            child, parent = edited(issue.person_id), edited(issue.other_id)
+            if parent.id in child.parents:
+                child.parents.remove(parent.id)
+            if child.id in parent.kids:
+                parent.kids.remove(child.id)
+    for person in changed.values():
+        graph.update(person)
+
+    added: List[Person] = []
+    for issue in issues:
+        if issue.kind == DUPLICATE_ID:
+            person = replace(issue.person, id=graph.next_id(), partners=[], parents=[], kids=[])
+            graph.add(person)
+            added.append(person)
+    return list(changed.values()) + added
@@ -0,0 +1,261 @@
+"""Names how two people of a family file are related.
+
+    python kinship.py family_info.json 12 40
+
+prints for example "Anna Novak is Jan Novak's second cousin once removed"
+followed by the people linking them.
+"""
+import argparse
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from person import Person
+from family_graph import FamilyGraph
+
+# ancestor id -> (generations up, id one generation closer to the person)
+AncestorMap = Dict[int, Tuple[int, Optional[int]]]
+
+# ancestor maps kept by an AncestorIndex
+INDEX_SIZE: int = 4096
+ORDINALS = ("first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth")
+REMOVED = ("", " once removed", " twice removed")
+
+@dataclass
+class Relationship:
+    """How person b is related to person a, read as "b is a's <name>".
+    path holds the ids linking them, a first and b last. up and down count
+    the generations from a and from b to their lowest common ancestors, both
+    stay 0 for partners.
+    """
+    name: str
+    path: List[int]
+    common_ancestors: List[int] = field(default_factory=list)
+    up: int = 0
+    down: int = 0
+
+# =======================
+# NAMES
+# =======================
+
+def ordinal(n: int) -> str:
+    if n <= len(ORDINALS):
+        return ORDINALS[n - 1]
+    suffix = "th" if n % 100 in (11, 12, 13) else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+def greats(n: int) -> str:
+    if n <= 0:
+        return ""
+    return "great-" * n if n <= 2 else f"{n}x great-"
+
+def lineal_name(generations: int, word: str) -> str:
+    """parent, grandparent, great-grandparent... for word "parent"."""
+    if generations == 1:
+        return word
+    return greats(generations - 2) + "grand" + word
+
+def blood_name(up: int, down: int, half: bool = False) -> str:
+    """Name of the relative down generations below the common ancestor of
+    someone up generations below it.
+    """
+    if up == 0 and down == 0:
+        return "self"
+    if up == 0:
+        return lineal_name(down, "child")
+    if down == 0:
+        return lineal_name(up, "parent")
+    prefix = "half " if half else ""
+    if up == 1 and down == 1:
+        return prefix + "sibling"
+    if up == 1:
+        return prefix + lineal_name(down - 1, "niece/nephew")
+    if down == 1:
+        return prefix + greats(up - 2) + "aunt/uncle"
+    removed = abs(up - down)
+    suffix = REMOVED[removed] if removed < len(REMOVED) else f" {removed} times removed"
+    return f"{prefix}{ordinal(min(up, down) - 1)} cousin{suffix}"
+
+# =======================
+# ANCESTORS
+# =======================
+
+def ancestor_map(graph: FamilyGraph, id: int) -> AncestorMap:
+    """Every ancestor of the person with the person itself at 0, found
+    breadth first so each gets its shortest distance. Cycles end the walk.
+    """
+    found: AncestorMap = {id: (0, None)}
+    frontier = [id]
+    generation = 0
+    while frontier:
+        generation += 1
+        next_frontier = []
+        for person in graph.resolve(frontier):
+            for parent_id in graph.parents.get(person.id, ()):
+                if parent_id not in found:
+                    found[parent_id] = (generation, person.id)
+                    next_frontier.append(parent_id)
+        frontier = next_frontier
+    return found
+
+class AncestorIndex:
+    """Cache of ancestor maps for repeated relationship queries.
+
+    A query then only intersects two maps that are usually already built.
+    The maps of the INDEX_SIZE most recently used people are kept, any edit
+    of the graph drops them all since it can change everyone's ancestry.
+    """
+
+    def __init__(self, graph: FamilyGraph, size: int = INDEX_SIZE):
+        self.graph = graph
+        self.size = size
+        self.maps: "OrderedDict[int, AncestorMap]" = OrderedDict()
+        graph.register_callback(self.on_graph_changed)
+
+    def close(self):
+        self.graph.unregister_callback(self.on_graph_changed)
+
+    def on_graph_changed(self, action: str, person: Person):
+        self.maps.clear()
+
+    def ancestors(self, id: int) -> AncestorMap:
+        found = self.maps.get(id)
+        if found is None:
+            found = self.maps[id] = ancestor_map(self.graph, id)
+            if len(self.maps) > self.size:
+                self.maps.popitem(last=False)
+        else:
+            self.maps.move_to_end(id)
+        return found
+
+# =======================
+# COMMON ANCESTORS
+# =======================
+
+def meet(graph: FamilyGraph, a: int, b: int) -> Tuple[Dict[int, Tuple[int, int]], AncestorMap, AncestorMap]:
+    """Searches up from both people at once, one generation at a time on the
+    side that is behind. Returns the common ancestors found with their
+    distance from a and from b, and what was seen of both ancestries.
+
+    The search stops once no unseen common ancestor can be closer than the
+    best one found: such an ancestor is missing from a side that is still
+    going, so it is at least one generation beyond that side.
+    """
+    sides: Tuple[AncestorMap, AncestorMap] = ({a: (0, None)}, {b: (0, None)})
+    frontiers = [[a], [b]]
+    levels = [0, 0]
+    common: Dict[int, Tuple[int, int]] = {a: (0, 0)} if a == b else {}
+    best = 0 if a == b else None
+    while True:
+        going = [side for side in (0, 1) if frontiers[side]]
+        if not going or (best is not None and best <= min(levels[side] for side in going) + 1):
+            break
+        side = min(going, key= lambda side: (levels[side], len(frontiers[side])))
+        seen, other = sides[side], sides[1 - side]
+        levels[side] += 1
+        next_frontier = []
+        for person in graph.resolve(frontiers[side]):
+            for parent_id in graph.parents.get(person.id, ()):
+                if parent_id in seen:
+                    continue
+                seen[parent_id] = (levels[side], person.id)
+                next_frontier.append(parent_id)
+                if parent_id in other:
+                    distances = (levels[side], other[parent_id][0]) if side == 0 else (other[parent_id][0], levels[side])
+                    common[parent_id] = distances
+                    best = sum(distances) if best is None else min(best, sum(distances))
+        frontiers[side] = next_frontier
+    return common, sides[0], sides[1]
+
+def meet_indexed(index: AncestorIndex, a: int, b: int) -> Tuple[Dict[int, Tuple[int, int]], AncestorMap, AncestorMap]:
+    """Same as meet, from the full ancestor maps of the index."""
+    up, down = index.ancestors(a), index.ancestors(b)
+    if len(up) <= len(down):
+        common = {id: (distance, down[id][0]) for id, (distance, _) in up.items() if id in down}
+    else:
+        common = {id: (up[id][0], distance) for id, (distance, _) in down.items() if id in up}
+    return common, up, down
+
+def walk(ancestors: AncestorMap, id: int) -> List[int]:
+    """Ids from the ancestor down to the person the map belongs to."""
+    path = []
+    while id is not None:
+        path.append(id)
+        id = ancestors[id][1]
+    return path
+
+# =======================
+# RELATIONSHIPS
+# =======================
+
+def blood_relationship(graph: FamilyGraph, a: int, b: int, index: AncestorIndex = None) -> Optional[Relationship]:
+    """Relationship through the lowest common ancestors of a and b, None if they have none."""
+    common, up_map, down_map = meet_indexed(index, a, b) if index else meet(graph, a, b)
+    if not common:
+        return None
+    best = min(sum(distances) for distances in common.values())
+    lowest = sorted((max(distances), id) for id, distances in common.items() if sum(distances) == best)
+    ancestor = lowest[0][1]
+    up, down = common[ancestor]
+    to_a, to_b = walk(up_map, ancestor), walk(down_map, ancestor)
+
+    half = False
+    if up and down:
+        # the children of the ancestor on each line are full siblings only with the same parents
+        half = set(graph.parents.get(to_a[1], ())) != set(graph.parents.get(to_b[1], ()))
+    return Relationship(blood_name(up, down, half), to_a[::-1] + to_b[1:], [id for _, id in lowest], up, down)
+
+def relationship(graph: FamilyGraph, a: int, b: int, index: AncestorIndex = None) -> Optional[Relationship]:
+    """Names how b is related to a: by blood, as a partner, or through a
+    partner as an in-law or step relative. None if they are not related.
+    """
+    found = blood_relationship(graph, a, b, index)
+    if found:
+        return found
+    person_a, person_b = graph.get(a), graph.get(b)
+    if person_a is None or person_b is None:
+        return None
+    if b in graph.partners.get(a, ()):
+        return Relationship("partner", [a, b])
+
+    candidates: List[Relationship] = []
+    # a relative of a's partner
+    for partner in graph.partners_of(person_a):
+        through = blood_relationship(graph, partner.id, b, index)
+        if through:
+            name = "step-child" if (through.up, through.down) == (0, 1) else through.name + "-in-law"
+            candidates.append(Relationship(name, [a] + through.path, through.common_ancestors, through.up, through.down))
+    # the partner of a's relative
+    for partner in graph.partners_of(person_b):
+        through = blood_relationship(graph, a, partner.id, index)
+        if through:
+            name = "step-parent" if (through.up, through.down) == (1, 0) else through.name + "-in-law"
+            candidates.append(Relationship(name, through.path + [b], through.common_ancestors, through.up, through.down))
+    return min(candidates, key= lambda x: len(x.path), default=None)
+
+# =======================
+# COMMAND LINE
+# =======================
+
+def main(argv: List[str] = None) -> int:
+    from family_io import load_graph
+    from family_db import SqliteFamilyGraph, is_database
+
+    parser = argparse.ArgumentParser(description="Name how two people of a family file are related.")
+    parser.add_argument("file", help="family JSON file or SQLite database")
+    parser.add_argument("a", type=int, help="id of the first person")
+    parser.add_argument("b", type=int, help="id of the person named relative to the first")
+    args = parser.parse_args(argv)
+
+    graph = SqliteFamilyGraph(args.file) if is_database(args.file) else load_graph(args.file)
+    found = relationship(graph, args.a, args.b)
+    if found is None:
+        print("not related")
+        return 1
+    name_a, name_b = (graph.get(id).search_name for id in (args.a, args.b))
+    print(f"{name_b} is {name_a}'s {found.name}")
+    print(" -> ".join(graph.get(id).search_name for id in found.path))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
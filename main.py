@@ -1,4 +1,4 @@
-import json
+import os
 from dataclasses import dataclass, field
 from typing import List
 from datetime import datetime
@@ -7,13 +7,24 @@ from PySide6.QtWidgets import (
     QApplication, QWidget, QListWidget, QLineEdit, QTextEdit,
     QPushButton, QFileDialog, QLabel, QHBoxLayout, QVBoxLayout,
     QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsTextItem,
-    QMessageBox, QComboBox, QListWidgetItem, QFrame
+    QMessageBox, QComboBox, QListWidgetItem, QFrame, QProgressBar, QListView, QCheckBox
 )
 from PySide6.QtGui import QPen, QBrush, QImage, QPainter
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QThreadPool, QTimer
 from person import Person
+from family_graph import FamilyGraph
+from family_io import EditJournal, save_graph
+from family_db import SqliteFamilyGraph, is_database, save_database, export_json
 from family_tree_view import FamilyTreeView
+from graph_loader import GraphLoadTask
+from people_index import PeopleIndex
+from people_list_model import PeopleListModel
+from tree_layout import AncestryCycleError
+from integrity import Issue, check_graph, describe, repair
 from person_editor import PersonEditor
+from refresh_scheduler import RefreshScheduler
+from photo_thumbnails import thumbnail_cache
+import profiling
 
 # =======================
 # MAIN WINDOW
@@ -25,12 +36,24 @@ class FamilyEditor(QWidget):
         self.setWindowTitle("Family Tree Editor (Timeline)")
         self.resize(1250, 650)
 
-        self.people: List[Person] = []
+        self.graph: FamilyGraph = FamilyGraph()
+        # records every edit of a graph loaded from JSON next to its file
+        self.journal: EditJournal = None
         self.current_person = None
         
         self.person_editor = PersonEditor()
 
-        self.list_widget = QListWidget()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search name or birth year...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.fill_list)
+        # built when the graph is loaded or on the first search
+        self.search_index: PeopleIndex = None
+
+        self.people_model = PeopleListModel()
+        self.list_view = QListView()
+        self.list_view.setModel(self.people_model)
+        self.list_view.setUniformItemSizes(True)
 
         self.add_btn = QPushButton("Add Person")
         self.add_btn.clicked.connect(self.add_person)
@@ -47,38 +70,69 @@ class FamilyEditor(QWidget):
         self.save_json_btn = QPushButton("Save JSON")
         self.save_json_btn.clicked.connect(self.save_json)
 
-        self.export_btn = QPushButton("Export Graph (JPEG)")
+        self.export_btn = QPushButton("Export Graph (JPEG/PNG)")
         self.export_btn.clicked.connect(self.export_graph)
 
-        self.list_widget.currentRowChanged.connect(lambda select_person: self.select_person_from_index(select_person))
+        self.load_task: GraphLoadTask = None
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 1000)
+        self.load_progress.setTextVisible(False)
+        self.load_progress.setVisible(False)
+
+        self.profile_check = QCheckBox("Show Timings")
+        self.profile_check.setChecked(profiling.enabled)
+        self.profile_check.toggled.connect(self.set_profiling)
+        self.trace_btn = QPushButton("Save Trace")
+        self.trace_btn.clicked.connect(self.save_trace)
+        # status line with the slowest spans and the counters, refreshed while profiling
+        self.profile_label = QLabel()
+        self.profile_label.setWordWrap(True)
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setInterval(500)
+        self.profile_timer.timeout.connect(self.update_profile_label)
+
+        self.list_view.selectionModel().currentRowChanged.connect(lambda current, previous: self.select_person_from_index(current.row()))
         self.person_editor.register_refresh(self.refresh)
 
-        self.tree_view = FamilyTreeView(self.select_person)
+        self.tree_view = FamilyTreeView(self.select_person, virtualized=True, asynchronous=True)
+        self.tree_view.draw_failed.connect(lambda message: QMessageBox.warning(self, "Family Tree", message))
+
+        # edits and selections only mark what is stale, it is rebuilt once on the next event loop turn
+        self.scheduler = RefreshScheduler(self)
+        self.scheduler.register("people", self.reload_tree, covers=("tree",))
+        self.scheduler.register("tree", self.draw_tree)
+        self.scheduler.register("editor", self.reload_editor)
 
         self.build_ui()
     
     def select_person_from_index(self, index):
-        if index < 0 or index >= len(self.people):
+        person = self.people_model.person_at(index)
+        if person is None:
             return None
-        self.current_person = self.people[index]
+        self.current_person = person
         self.select_person(self.current_person)
     
     def select_person(self, sel):
         self.person_editor.select_person(sel)
-        self.tree_view.select_ref(self.person_editor.current_person)
+        self.tree_view.set_ref(self.person_editor.current_person)
+        self.scheduler.invalidate("tree")
     
     def open_person_editor(self):
         self.person_editor.show()
 
     def build_ui(self):
         left = QVBoxLayout()
-        left.addWidget(self.list_widget)
+        left.addWidget(self.search_edit)
+        left.addWidget(self.list_view)
         left.addWidget(self.edit_btn)
         left.addWidget(self.add_btn)
         left.addWidget(self.remove_btn)
         left.addWidget(self.load_btn)
         left.addWidget(self.save_json_btn)
         left.addWidget(self.export_btn)
+        left.addWidget(self.load_progress)
+        left.addWidget(self.profile_check)
+        left.addWidget(self.trace_btn)
 
         self.fixed_container = QFrame()
         self.fixed_container.setFixedWidth(250)  # Constrain the sidebar width
@@ -87,7 +141,11 @@ class FamilyEditor(QWidget):
 
         layout = QHBoxLayout(self)
         layout.addWidget(self.fixed_container)
-        layout.addLayout(self.tree_view)
+        right = QVBoxLayout()
+        right.addLayout(self.tree_view)
+        right.addWidget(self.profile_label)
+        layout.addLayout(right)
+        self.set_profiling(profiling.enabled)
 
         self.load_json_from_file("./family_info.json")
 
@@ -96,75 +154,226 @@ class FamilyEditor(QWidget):
     # =======================
 
     def next_id(self):
-        return max((p.id for p in self.people), default=0) + 1
+        return self.graph.next_id()
+
+    def fill_list(self):
+        """Lists everyone, or the best matches of the search text. Edits
+        afterwards reach the list through the model, not through here.
+        """
+        query = self.search_edit.text()
+        if query.strip():
+            if self.search_index is None:
+                self.search_index = PeopleIndex(self.graph)
+                self.person_editor.update_people(self.graph, self.search_index)
+            self.people_model.show_ids(self.search_index.search(query))
+        else:
+            self.people_model.show_all()
 
     def refresh(self):
-        self.list_widget.clear()
-        self.people.sort(key = lambda p: (p.last_name + " " + p.name))
-        for p in self.people:
-            self.list_widget.addItem(p.search_name or "(Unnamed)")
-        self.tree_view.set_people(self.people)
-        self.tree_view.draw_tree()
+        """Marks everything showing people as stale after an edit."""
+        self.scheduler.invalidate("people", "editor")
+
+    def reload_tree(self):
+        try:
+            self.tree_view.set_people(self.graph)
+        except AncestryCycleError as e:
+            QMessageBox.warning(self, "Family Tree", str(e))
+
+    def draw_tree(self):
+        try:
+            self.tree_view.redraw()
+        except AncestryCycleError as e:
+            QMessageBox.warning(self, "Family Tree", str(e))
+
+    def reload_editor(self):
+        """Shows the edited person again, an edit elsewhere may have changed its relations."""
+        current = self.person_editor.current_person
+        if current is None:
+            return
+        person = self.graph.get(current.id)
+        if person is None:
+            self.person_editor.clear()
+        else:
+            self.person_editor.select_person(person)
 
     def add_person(self):
-        self.people.append(Person(self.next_id(), "", "", "", "", "", "", "", ""))
+        person = Person(self.next_id(), "", "", "", "", "", "", "", "")
+        if self.search_edit.text():
+            # the new person is unnamed, it has to be listed to be selected below
+            self.search_edit.blockSignals(True)
+            self.search_edit.clear()
+            self.search_edit.blockSignals(False)
+            self.fill_list()
+        self.graph.add(person)
         self.refresh()
-        self.list_widget.setCurrentRow(0)
+        self.list_view.setCurrentIndex(self.people_model.index(self.people_model.row_of(person.id)))
 
     def remove_person(self):
-        idx = self.list_widget.currentRow()
-        if idx < 0:
+        person = self.people_model.person_at(self.list_view.currentIndex().row())
+        if person is None:
             return
-        person = self.people[idx]
         confirm = QMessageBox.question(
             self, "Confirm",
             f"Remove {person.name}?",
             QMessageBox.Yes | QMessageBox.No
         )
         if confirm == QMessageBox.Yes:
-            self.people.pop(idx)
-            for p in self.people:
-                if person.name in p.kids:
-                    try:
-                        p.parents.remove(person.name)
-                    except:
-                        pass
-                    try:
-                        p.kids.remove(person.name)
-                    except:
-                        pass
-                    try:
-                        p.partners.remove(person.name)
-                    except:
-                        pass
+            self.graph.remove(person)
             self.current_person = None
             self.refresh()
         
     def load_json_from_file(self, filename):
-        with open(filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        self.people = [Person.from_dict(p) for p in data["people"]]
-        # self.people.sort(key = lambda p: p.name)
-        self.person_editor.update_people(self.people)
+        """Loads the file on a worker thread, the window stays usable meanwhile."""
+        if self.load_task:
+            self.load_task.cancel()
+        # photo paths are relative to the family file
+        thumbnail_cache().folder = os.path.dirname(os.path.abspath(filename))
+        if is_database(filename):
+            self.load_task = None
+            self.load_progress.setVisible(False)
+            self.set_graph(SqliteFamilyGraph(filename))
+            return
+        if self.journal and os.path.exists(filename) and os.path.samefile(filename, self.journal.filename):
+            # let a running compaction finish before the file is read again
+            self.journal.close()
+            self.journal = None
+        self.load_task = GraphLoadTask(filename)
+        self.load_task.signals.progress.connect(self.on_load_progress)
+        self.load_task.signals.finished.connect(self.on_graph_loaded)
+        self.load_task.signals.failed.connect(self.on_load_failed)
+        self.load_progress.setValue(0)
+        self.load_progress.setVisible(True)
+        QThreadPool.globalInstance().start(self.load_task)
+
+    def is_current_load(self) -> bool:
+        return self.load_task is not None and self.sender() is self.load_task.signals
+
+    def on_load_progress(self, bytes_read: int, total: int):
+        if self.is_current_load() and total:
+            self.load_progress.setValue(int(bytes_read * 1000 / total))
+
+    def on_graph_loaded(self, graph: FamilyGraph):
+        if not self.is_current_load():
+            return
+        filename = self.load_task.filename
+        index = self.load_task.index
+        issues = self.load_task.issues
+        self.load_task = None
+        self.load_progress.setVisible(False)
+        self.set_graph(graph, index)
+        self.journal = EditJournal(filename, graph)
+        if issues:
+            # repairs go through the journal like any other edit
+            self.offer_repair(issues)
+
+    def set_graph(self, graph: FamilyGraph, index: PeopleIndex = None):
+        if self.search_index:
+            self.search_index.close()
+        self.search_index = index
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if isinstance(self.graph, SqliteFamilyGraph):
+            self.graph.close()
+        self.graph = graph
+        self.person_editor.update_people(self.graph, index)
+        self.person_editor.clear()
+        self.people_model.set_graph(graph)
+        self.fill_list()
         self.refresh()
 
+    def on_load_failed(self, message: str):
+        if not self.is_current_load():
+            return
+        self.load_task = None
+        self.load_progress.setVisible(False)
+        QMessageBox.warning(self, "Load JSON", message)
+
     def load_json(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Load JSON", "", "JSON Files (*.json)")
+        path, _ = QFileDialog.getOpenFileName(self, "Load JSON", "", "Family Files (*.json *.db *.sqlite);;JSON Files (*.json);;SQLite Databases (*.db *.sqlite)")
         if not path:
             return
         self.load_json_from_file(path)
 
     def save_json(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Save JSON", "", "JSON Files (*.json)")
-        if not path:
+        path, _ = QFileDialog.getSaveFileName(self, "Save JSON", "", "JSON Files (*.json);;SQLite Databases (*.db *.sqlite)")
+        if not path or not self.check_before_save():
             return
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"people": [p.to_dict() for p in self.people]}, f, indent=2)
+        with profiling.span("save_json"):
+            self.write_file(path)
 
-    def export_graph(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Export JPEG", "", "JPEG (*.jpg)")
+    def write_file(self, path: str):
+        if is_database(path):
+            # a database graph already writes every change through to its file
+            if not (isinstance(self.graph, SqliteFamilyGraph) and os.path.exists(path) and os.path.samefile(path, self.graph.filename)):
+                save_database(path, self.graph)
+        elif isinstance(self.graph, SqliteFamilyGraph):
+            export_json(self.graph, path)
+        elif self.journal and os.path.exists(path) and os.path.samefile(path, self.journal.filename):
+            self.journal.save()
+        else:
+            save_graph(path, self.graph)
+
+    # =======================
+    # INTEGRITY
+    # =======================
+
+    def offer_repair(self, issues: List[Issue], buttons = QMessageBox.Yes | QMessageBox.No):
+        """Lists the problems and repairs them if the user agrees, returns the answer."""
+        answer = QMessageBox.question(
+            self, "Family Links",
+            f"Problems were found in the relation lists:\n{describe(issues)}\n\nRepair them?",
+            buttons
+        )
+        if answer == QMessageBox.Yes:
+            repair(self.graph, issues)
+            self.refresh()
+        return answer
+
+    def check_before_save(self) -> bool:
+        """Offers to repair the relation lists, returns False if the save is cancelled."""
+        if isinstance(self.graph, SqliteFamilyGraph):
+            # only the people fetched so far are in memory
+            return True
+        issues = check_graph(self.graph)
+        if not issues:
+            return True
+        return self.offer_repair(issues, QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel) != QMessageBox.Cancel
+
+    # =======================
+    # PROFILING
+    # =======================
+
+    def set_profiling(self, on: bool):
+        """Switches the timing spans on or off, the collected ones start over."""
+        profiling.enable(on)
+        profiling.reset()
+        self.trace_btn.setVisible(on)
+        self.profile_label.setVisible(on)
+        self.profile_label.clear()
+        if on:
+            self.profile_timer.start()
+        else:
+            self.profile_timer.stop()
+
+    def update_profile_label(self):
+        self.profile_label.setText(profiling.summary() or "Nothing timed yet")
+
+    def save_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Trace", "", "Chrome Trace (*.json)")
         if path:
-            self.tree_view.export_to_jpeg(path)
+            profiling.write_trace(path)
+
+    def export_graph(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Graph", "", "JPEG (*.jpg);;PNG (*.png)")
+        if not path:
+            return
+        # a redraw still waiting for the event loop would be missing from the image
+        self.scheduler.flush()
+        try:
+            self.tree_view.export_image(path)
+        except ValueError as e:
+            QMessageBox.warning(self, "Export", str(e))
 
 
 # =======================
@@ -0,0 +1,129 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Set, Tuple
+from family_graph import FamilyGraph
+from person import Person
+
+TOKEN = re.compile(r"\w+")
+DEFAULT_LIMIT: int = 200
+
+def normalize(text: str) -> str:
+    """Lower case without accents, so "Zoë" is found by "zoe"."""
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class PeopleIndex:
+    """Search index over the names and birth years of a graph.
+
+    Every word of Person.search_name and the middle name is kept in a sorted
+    token list for prefix lookups, and the three letter slices of each
+    distinct word in a trigram map for matches inside words. Names repeat a
+    lot, so the trigram map stays small. The index listens to the graph and
+    re-indexes only the people that change.
+    """
+
+    def __init__(self, graph: FamilyGraph):
+        self.graph = graph
+        # id -> normalized text and its tokens
+        self.entries: Dict[int, Tuple[str, Set[str]]] = {}
+        self.tokens: List[str] = []
+        self.token_ids: Dict[str, Set[int]] = {}
+        self.trigram_tokens: Dict[str, Set[str]] = {}
+        for person in graph:
+            self.add(person)
+        graph.register_callback(self.on_graph_changed)
+
+    def close(self):
+        self.graph.unregister_callback(self.on_graph_changed)
+
+    def on_graph_changed(self, action: str, person: Person):
+        self.remove(person.id)
+        if action != "remove":
+            self.add(person)
+
+    def add(self, person: Person):
+        text = normalize(" ".join(x for x in (person.search_name or "(Unnamed)", person.middle_name) if x))
+        tokens = set(TOKEN.findall(text))
+        self.entries[person.id] = (text, tokens)
+        for token in tokens:
+            ids = self.token_ids.get(token)
+            if ids is None:
+                ids = self.token_ids[token] = set()
+                insort(self.tokens, token)
+                for trigram in trigrams(token):
+                    self.trigram_tokens.setdefault(trigram, set()).add(token)
+            ids.add(person.id)
+
+    def remove(self, id: int):
+        entry = self.entries.pop(id, None)
+        if entry is None:
+            return
+        text, tokens = entry
+        for token in tokens:
+            ids = self.token_ids[token]
+            ids.discard(id)
+            if not ids:
+                del self.token_ids[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+                for trigram in trigrams(token):
+                    self.trigram_tokens[trigram].discard(token)
+                    if not self.trigram_tokens[trigram]:
+                        del self.trigram_tokens[trigram]
+
+    def prefix_ids(self, prefix: str) -> Tuple[Set[int], Set[int]]:
+        """Returns the ids with a token equal to prefix and those with a token starting with it."""
+        exact = self.token_ids.get(prefix, set())
+        found: Set[int] = set(exact)
+        i = bisect_left(self.tokens, prefix)
+        tokens = self.tokens
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            found |= self.token_ids[tokens[i]]
+            i += 1
+        return exact, found
+
+    def substring_ids(self, term: str) -> Set[int]:
+        """Returns the ids with a word containing term, found through its trigrams."""
+        grams = sorted((self.trigram_tokens.get(x, set()) for x in trigrams(term)), key=len)
+        if not grams:
+            return set()
+        found: Set[int] = set()
+        for token in grams[0].intersection(*grams[1:]):
+            if term in token:
+                found |= self.token_ids[token]
+        return found
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[int]:
+        """Returns up to limit ids matching every word of the query, best first:
+        whole words, then word prefixes, then matches inside words, each
+        group ordered by name.
+        """
+        terms = TOKEN.findall(normalize(query))
+        if not terms:
+            return []
+        exact: Set[int] = None
+        prefixed: Set[int] = None
+        for term in terms:
+            term_exact, term_found = self.prefix_ids(term)
+            exact = term_exact if exact is None else exact & term_exact
+            prefixed = term_found if prefixed is None else prefixed & term_found
+
+        inside: Set[int] = set()
+        if len(prefixed) < limit and all(len(term) >= 3 for term in terms):
+            inside = None
+            for term in terms:
+                ids = self.substring_ids(term)
+                inside = ids if inside is None else inside & ids
+            inside -= prefixed
+
+        entries = self.entries
+        ranked = heapq.nsmallest(limit, ((0 if id in exact else 1, entries[id][0], id) for id in prefixed))
+        if len(ranked) < limit:
+            ranked += heapq.nsmallest(limit - len(ranked), ((2, entries[id][0], id) for id in inside))
+        return [id for _, _, id in ranked]
@@ -1,32 +1,58 @@
 import sys
-from typing import List
+from typing import Dict, Iterable, List, Set
 from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QComboBox, QListWidget, QListWidgetItem, 
+                             QLineEdit, QCompleter, QListWidget, QListWidgetItem, 
                              QLabel, QPushButton)
+from PySide6.QtCore import QModelIndex, QStringListModel, QTimer
 from person import Person
+from family_graph import FamilyGraph
+from people_index import PeopleIndex, normalize
+
+# most people offered by the picker at once
+MATCH_LIMIT: int = 50
 
 class PeopleListEditor(QWidget):
     def __init__(self, people: List[Person]):
+        """people is a list or a FamilyGraph of the people that can be picked.
+        Nobody is listed up front, the picker offers the people whose name
+        matches what is typed into it.
+        """
         super().__init__()
         self.current_people: List[Person] = []
+        # ids of current_people, and of people never offered such as the edited person
+        self.current_ids: Set[int] = set()
+        self.excluded_ids: Set[int] = set()
+        # list row of each current person
+        self.rows: Dict[int, QListWidgetItem] = {}
         self._callbacks = [] # List of registered callback functions
         self.diff_added: List[Person] = []
         self.diff_removed: List[Person] = []
-        self.people: List[Person] = people
+        self.people: FamilyGraph = FamilyGraph()
+        # optional name index of the graph, searched instead of scanning everyone
+        self.index: PeopleIndex = None
+        # people offered by the picker, in the order of its rows
+        self.matches: List[Person] = []
         
         # UI Setup
         self.layout = QVBoxLayout(self)
-        self.combo = QComboBox()
-        self.combo.activated.connect(self._on_combo_activated)
+        self.picker = QLineEdit()
+        self.picker.setPlaceholderText("Type a name to add...")
+        self.picker.textEdited.connect(self._on_picker_edited)
+        self.match_model = QStringListModel(self)
+        self.completer = QCompleter(self.match_model, self)
+        # the model already holds only the matches
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.activated[QModelIndex].connect(self._on_match_activated)
+        self.picker.setCompleter(self.completer)
         
         self.list_widget = QListWidget()
         
         self.layout.addWidget(QLabel("Available People:"))
-        self.layout.addWidget(self.combo)
+        self.layout.addWidget(self.picker)
         self.layout.addWidget(QLabel("Selected People:"))
         self.layout.addWidget(self.list_widget)
         
-        self.set_data(self.people)
+        self.set_data(people)
 
     # --- Callback Interface ---
     def register_callback(self, func):
@@ -45,66 +71,89 @@ class PeopleListEditor(QWidget):
                 print(f"Error in callback: {e}")
 
     # --- Public API for Data Management ---
-    def set_data(self, people: List[Person], current_people: List[int] = []):
-        self.people: List[Person] = people
+    def set_data(self, people: List[Person], current_people: List[Person] = [], exclude: Iterable[int] = (), index: PeopleIndex = None):
+        """Sets the people to pick from and those already picked. Ids in
+        exclude are never offered, index speeds up the picker when given.
+        """
+        self.people = people if isinstance(people, FamilyGraph) else FamilyGraph(people)
+        self.index = index
+        self.excluded_ids = set(exclude)
         self.current_people = []
+        self.current_ids.clear()
+        self.rows.clear()
         self.list_widget.clear()
+        self.picker.clear()
+        self.match_model.setStringList([])
+        self.matches = []
         
         if current_people:
             for person in current_people:
                 self.add_item(person, notify=False)
-        
-        self.update_combo_options()
 
     def add_item(self, person: Person, notify=True):
-        if person in self.people and person not in self.current_people:
-            self.current_people.append(person)
-            self._create_list_row(person)
-            self.update_combo_options()
-            if notify:
-                if person in self.diff_removed:
-                    self.diff_removed.remove(person)
-                else:
-                    self.diff_added.append(person)
-                self._notify("added", person)
-            return True
-        return False
+        if person.id in self.current_ids or person.id in self.excluded_ids or person.id not in self.people:
+            return False
+        self.current_people.append(person)
+        self.current_ids.add(person.id)
+        self._create_list_row(person)
+        if notify:
+            if not self._discard(self.diff_removed, person):
+                self.diff_added.append(person)
+            self._notify("added", person)
+        return True
 
     def remove_item(self, person: Person, notify=True):
-        if person in self.current_people:
-            self.current_people.remove(person)
-            # Find the widget item associated with this name
-            for i in range(self.list_widget.count()):
-                item = self.list_widget.item(i)
-                # We store the name in the item data or look it up via the widget
-                row_widget = self.list_widget.itemWidget(item)
-                if row_widget.findChild(QLabel).text() == person.search_name:
-                    self.list_widget.takeItem(i)
+        if person.id not in self.current_ids:
+            return False
+        self.current_ids.discard(person.id)
+        self._discard(self.current_people, person)
+        self.list_widget.takeItem(self.list_widget.row(self.rows.pop(person.id)))
+        if notify:
+            if not self._discard(self.diff_added, person):
+                self.diff_removed.append(person)
+            self._notify("removed", person)
+        return True
+
+    def find_matches(self, text: str, limit: int = MATCH_LIMIT) -> List[Person]:
+        """People not picked yet whose name matches text, at most limit."""
+        if not text.strip():
+            return []
+        hidden = self.current_ids | self.excluded_ids
+        if self.index:
+            ids = [id for id in self.index.search(text, limit + len(hidden)) if id not in hidden]
+            return self.people.resolve(ids[:limit])
+        query = normalize(text.strip())
+        matches = []
+        for person in self.people:
+            if person.id not in hidden and query in normalize(person.search_name):
+                matches.append(person)
+                if len(matches) == limit:
                     break
-            
-            self.update_combo_options()
-            if notify:
-                if person in self.diff_added:
-                    self.diff_added.remove(person)
-                else:
-                    self.diff_removed.append(person)
-                self._notify("removed", person)
-            return True
-        return False
+        return matches
 
     # --- Internal UI Logic ---
-    def update_combo_options(self):
-        self.combo.clear()
-        self.selection: List[Person] = [x for x in self.people if x not in self.current_people]
-        if self.selection:
-            self.combo.addItem("Select to add...")
-            self.combo.addItems([x.search_name for x in self.selection])
-        else:
-            self.combo.addItem("No more items")
-
-    def _on_combo_activated(self, index):
-        if index > 0:
-            self.add_item(self.selection[index - 1])
+    @staticmethod
+    def _discard(people: List[Person], person: Person) -> bool:
+        """Removes the entry with the person's id, returns False if there is none."""
+        for i, other in enumerate(people):
+            if other.id == person.id:
+                del people[i]
+                return True
+        return False
+
+    def _on_picker_edited(self, text: str):
+        self.matches = self.find_matches(text)
+        self.match_model.setStringList([x.search_name or "(Unnamed)" for x in self.matches])
+        if self.matches:
+            self.completer.complete()
+
+    def _on_match_activated(self, index: QModelIndex):
+        if 0 <= index.row() < len(self.matches):
+            self.add_item(self.matches[index.row()])
+        self.matches = []
+        self.match_model.setStringList([])
+        # the completer writes the chosen name into the picker after this returns
+        QTimer.singleShot(0, self.picker.clear)
 
     def _create_list_row(self, person: Person):
         """Creates the visual row with label and button."""
@@ -124,6 +173,7 @@ class PeopleListEditor(QWidget):
         
         item.setSizeHint(row_widget.sizeHint())
         self.list_widget.setItemWidget(item, row_widget)
+        self.rows[person.id] = item
 
 # --- Example Usage ---
 def my_logger(action, person: Person):
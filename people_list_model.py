@@ -0,0 +1,131 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from family_graph import FamilyGraph
+from person import Person
+
+class PeopleListModel(QAbstractListModel):
+    """Rows of the people list, either everyone sorted by name or a fixed
+    list of ids such as search results.
+
+    Only (sort name, id) pairs are kept per row, the Person is looked up when
+    a row is painted. The model listens to the graph and inserts, removes or
+    updates the single row a change concerns.
+    """
+    ID_ROLE = Qt.UserRole
+
+    def __init__(self, graph: FamilyGraph = None, parent=None):
+        super().__init__(parent)
+        self.graph: FamilyGraph = None
+        self.rows: List[Tuple[str, int]] = []
+        # sort name of every listed id, cached so rows can be found by bisection
+        self.keys: Dict[int, str] = {}
+        self.sorted = True
+        self.set_graph(graph or FamilyGraph())
+
+    def set_graph(self, graph: FamilyGraph):
+        if self.graph:
+            self.graph.unregister_callback(self.on_graph_changed)
+        self.graph = graph
+        graph.register_callback(self.on_graph_changed)
+        self.show_all()
+
+    def close(self):
+        self.graph.unregister_callback(self.on_graph_changed)
+
+    def show_all(self):
+        self.beginResetModel()
+        self.rows = sorted(self.graph.name_keys())
+        self.keys = {id: key for key, id in self.rows}
+        self.sorted = True
+        self.endResetModel()
+
+    def show_ids(self, ids: List[int]):
+        """Lists the given ids in the given order."""
+        self.beginResetModel()
+        people = self.graph.resolve(ids)
+        self.rows = [(person.sort_name, person.id) for person in people]
+        self.keys = {id: key for key, id in self.rows}
+        self.sorted = False
+        self.endResetModel()
+
+    # --- Qt model interface ---
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        id = self.rows[index.row()][1]
+        if role == Qt.DisplayRole:
+            person = self.graph.get(id)
+            return (person.search_name or "(Unnamed)") if person else None
+        if role == self.ID_ROLE:
+            return id
+        return None
+
+    # --- Lookups ---
+    def id_at(self, row: int) -> Optional[int]:
+        return self.rows[row][1] if 0 <= row < len(self.rows) else None
+
+    def person_at(self, row: int) -> Optional[Person]:
+        id = self.id_at(row)
+        return None if id is None else self.graph.get(id)
+
+    def row_of(self, id: int) -> int:
+        """Row of the id, -1 if it is not listed."""
+        key = self.keys.get(id)
+        if key is None:
+            return -1
+        if not self.sorted:
+            return next(row for row, (_, row_id) in enumerate(self.rows) if row_id == id)
+        row = bisect_left(self.rows, (key, id))
+        return row if row < len(self.rows) and self.rows[row][1] == id else -1
+
+    # --- Graph changes ---
+    def insert_row(self, key: str, id: int):
+        row = bisect_left(self.rows, (key, id)) if self.sorted else len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.insert(row, (key, id))
+        self.keys[id] = key
+        self.endInsertRows()
+
+    def remove_row(self, row: int):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        key, id = self.rows.pop(row)
+        del self.keys[id]
+        self.endRemoveRows()
+
+    def on_graph_changed(self, action: str, person: Person):
+        if action == "add" and person.id not in self.keys:
+            # search results only change when searched again
+            if self.sorted:
+                self.insert_row(person.sort_name, person.id)
+            return
+        row = self.row_of(person.id)
+        if row < 0:
+            return
+        if action == "remove":
+            self.remove_row(row)
+            return
+        key = person.sort_name
+        if self.sorted and key != self.keys[person.id]:
+            row = self.move_row(row, key)
+        self.rows[row] = (key, person.id)
+        self.keys[person.id] = key
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def move_row(self, row: int, key: str) -> int:
+        """Moves a renamed row to its sorted place, returns the new row.
+        A move rather than remove and insert keeps the selection on it.
+        """
+        destination = bisect_left(self.rows, (key, self.rows[row][1]))
+        if destination in (row, row + 1):
+            return row
+        self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination)
+        entry = self.rows.pop(row)
+        new_row = destination - 1 if destination > row else destination
+        self.rows.insert(new_row, entry)
+        self.endMoveRows()
+        return new_row
@@ -1,7 +1,17 @@
+import sys
 from typing import List
 from dataclasses import dataclass, field
 
-@dataclass
+def interned(value) -> str:
+    """A single shared copy of a name. Hand edited files can hold null or
+    numbers, which become text like the rest.
+    """
+    if value is None:
+        return ""
+    return sys.intern(value if isinstance(value, str) else str(value))
+
+# slots drop the per instance __dict__, which dominates memory with many people
+@dataclass(slots=True)
 class Person:
     id: int
     name: str
@@ -16,6 +26,13 @@ class Person:
     parents: List[int] = field(default_factory=list)
     kids: List[int] = field(default_factory=list)
 
+    def __post_init__(self):
+        # names repeat a lot across a family, keep a single copy of each
+        self.name = interned(self.name)
+        self.middle_name = interned(self.middle_name)
+        self.last_name = interned(self.last_name)
+        self.family_name = interned(self.family_name)
+
     @property
     def birth_year(self) -> str:
         try:
@@ -23,6 +40,11 @@ class Person:
         except Exception:
             return 0
     
+    @property
+    def sort_name(self) -> str:
+        """Order of the people list."""
+        return self.last_name + " " + self.name
+
     @property
     def search_name(self) -> str:
         try:
@@ -58,48 +80,21 @@ class Person:
 
     @classmethod
     def from_dict(cls, data: dict) -> "Person":
-        
-        def get_str_non_interupt(name: str):
-            val = ""
-            try:
-                val = data[name]
-            except:
-                pass
-            return val
-        
-        def get_array_non_interupt(name: str):
-            val = []
-            try:
-                val = data.get(name,[])
-            except:
-                pass
-            return val
-
-        name=get_str_non_interupt("name")
-        middle_name=get_str_non_interupt("middle_name")
-        last_name=get_str_non_interupt("last_name")
-        family_name=get_str_non_interupt("family_name")
-        birth_date=get_str_non_interupt("birth_date")
-        death_date=get_str_non_interupt("death_date")
-        notes=get_str_non_interupt("notes")
-        photo_source=get_str_non_interupt("photo_source")
-        partners=get_array_non_interupt("partners")
-        parents=get_array_non_interupt("parents")
-        kids=get_array_non_interupt("kids")
-
+        # missing fields default to empty values
+        get = data.get
         return cls(
             id=data["id"],
-            name=name,
-            middle_name=middle_name,
-            last_name=last_name,
-            family_name=family_name,
-            birth_date=birth_date,
-            death_date=death_date,
-            notes=notes,
-            photo_source=photo_source,
-            partners=partners,
-            parents=parents,
-            kids=kids
+            name=get("name", ""),
+            middle_name=get("middle_name", ""),
+            last_name=get("last_name", ""),
+            family_name=get("family_name", ""),
+            birth_date=get("birth_date", ""),
+            death_date=get("death_date", ""),
+            notes=get("notes", ""),
+            photo_source=get("photo_source", ""),
+            partners=get("partners", []),
+            parents=get("parents", []),
+            kids=get("kids", [])
         )
 
     def to_dict(self) -> dict:
@@ -10,13 +10,16 @@ from PySide6.QtCore import Qt
 from typing import List
 from people_list_editor import PeopleListEditor
 from person import Person
+from family_graph import FamilyGraph
+from people_index import PeopleIndex
 
 class PersonEditor(QWidget):
 
     def __init__(self):
         super().__init__()
         self.resize(650, 650)
-        self.people: List[Person] = []
+        self.graph: FamilyGraph = FamilyGraph()
+        self.index: PeopleIndex = None
         self.current_person: Person = None
         self.refresh_callback = None
 
@@ -90,11 +93,21 @@ class PersonEditor(QWidget):
     def register_refresh(self, refresh_callback):
         self.refresh_callback = refresh_callback
     
-    def update_people(self, people):
-        self.people = people
+    def update_people(self, graph: FamilyGraph, index: PeopleIndex = None):
+        """index, when there is one, is used by the relation pickers to find people by name."""
+        self.graph = graph
+        self.index = index
+
+    def clear(self):
+        """Shows nobody, for when the edited person is gone."""
+        self.current_person = None
+        for edit in (self.name_edit, self.middle_name_edit, self.last_name_edit, self.family_name_edit, self.birth_edit, self.death_edit, self.notes_edit):
+            edit.clear()
+        for people_list in (self.parents_list, self.partners_list, self.kids_list):
+            people_list.set_data(self.graph, index=self.index)
 
     def select_person(self, person):
-        self.current_person = next(x for x in self.people if person == x)
+        self.current_person = self.graph.get(person.id)
         self.name_edit.setText(self.current_person.name)
         self.middle_name_edit.setText(self.current_person.middle_name)
         self.last_name_edit.setText(self.current_person.last_name)
@@ -103,11 +116,10 @@ class PersonEditor(QWidget):
         self.death_edit.setText(self.current_person.death_date)
         self.notes_edit.setText(self.current_person.notes)
 
-        available_people: List[Person] = [x for x in self.people if x != self.current_person]
-
-        self.parents_list.set_data(available_people, [x for x in self.people if x.id in self.current_person.parents])
-        self.partners_list.set_data(available_people, [x for x in self.people if x.id in self.current_person.partners])
-        self.kids_list.set_data(available_people, [x for x in self.people if x.id in self.current_person.kids])
+        exclude = (self.current_person.id,)
+        self.parents_list.set_data(self.graph, self.graph.parents_of(self.current_person), exclude, self.index)
+        self.partners_list.set_data(self.graph, self.graph.partners_of(self.current_person), exclude, self.index)
+        self.kids_list.set_data(self.graph, self.graph.kids_of(self.current_person), exclude, self.index)
 
     def save_changes(self):
         if not self.current_person:
@@ -123,6 +135,7 @@ class PersonEditor(QWidget):
         self.current_person.parents = [x.id for x in self.parents_list.current_people]
         self.current_person.partners = [x.id for x in self.partners_list.current_people]
         self.current_person.kids = [x.id for x in self.kids_list.current_people]
+        self.graph.update(self.current_person)
 
         def update_target_list(self_list, list_name):
             try:
@@ -144,6 +157,8 @@ class PersonEditor(QWidget):
                     tar_list.remove(self.current_person.id)
                 except:
                     pass
+            for target_person in add_diff + rem_diff:
+                self.graph.update(target_person)
             add_diff.clear()
             rem_diff.clear()
 
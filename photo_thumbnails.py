@@ -0,0 +1,207 @@
+import hashlib
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QCoreApplication, QStandardPaths, QSize, Qt, Signal
+from PySide6.QtGui import QImage, QImageReader, QPixmap
+import profiling
+
+# longest side of a thumbnail in pixels, twice the box photo so it stays sharp when zoomed in
+THUMBNAIL_SIDE: int = 112
+# bytes of decoded thumbnails kept in memory, the least recently drawn go first
+MEMORY_LIMIT: int = 32 * 1024 * 1024
+
+class ThumbnailSignals(QObject):
+    # path, QImage
+    finished = Signal(str, QImage)
+    # path, message
+    failed = Signal(str, str)
+
+class ThumbnailTask(QRunnable):
+    """Reads the thumbnail of one photo on a QThreadPool thread, from the disk
+    cache when it holds one for the current version of the file, otherwise by
+    decoding the photo at thumbnail size and writing it to the disk cache.
+    """
+
+    def __init__(self, path: str, side: int, disk_folder: Optional[str]):
+        super().__init__()
+        self.path = path
+        self.side = side
+        self.disk_folder = disk_folder
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        try:
+            modified = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            self.signals.failed.emit(self.path, e.strerror or str(e))
+            return
+        cached = self.cached_path(modified)
+        if cached and os.path.exists(cached):
+            image = QImage(cached)
+            if not image.isNull():
+                profiling.count("thumbnails from disk")
+                self.signals.finished.emit(self.path, image)
+                return
+        with profiling.span("decode thumbnail"):
+            reader = QImageReader(self.path)
+            # photos from cameras are stored sideways with an orientation tag
+            reader.setAutoTransform(True)
+            size = reader.size()
+            if size.isValid() and (size.width() > self.side or size.height() > self.side):
+                # the decoder skips the detail a thumbnail doesn't need
+                reader.setScaledSize(size.scaled(QSize(self.side, self.side), Qt.KeepAspectRatio))
+            image = reader.read()
+        if image.isNull():
+            self.signals.failed.emit(self.path, reader.errorString())
+            return
+        if image.width() > self.side or image.height() > self.side:
+            # the format could not scale while decoding
+            image = image.scaled(self.side, self.side, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        profiling.count("thumbnails decoded")
+        if cached:
+            self.write(image, cached)
+        self.signals.finished.emit(self.path, image)
+
+    def cached_path(self, modified: int) -> Optional[str]:
+        """File of the thumbnail in the disk cache, named after the path,
+        modification time and size so an edited photo gets a new thumbnail.
+        """
+        if not self.disk_folder:
+            return None
+        key = f"{self.path}\n{modified}\n{self.side}".encode("utf-8")
+        return os.path.join(self.disk_folder, hashlib.sha1(key).hexdigest() + ".png")
+
+    def write(self, image: QImage, cached: str):
+        # written under a temporary name so no other thread reads half a file
+        temporary = f"{cached}.{os.getpid()}.{id(self)}.tmp"
+        try:
+            os.makedirs(self.disk_folder, exist_ok=True)
+            if image.save(temporary, "PNG"):
+                os.replace(temporary, cached)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+class ThumbnailCache(QObject):
+    """Thumbnails of the photos of people, decoded in a pool of worker
+    threads. The thumbnails drawn last are kept in memory up to memory_limit
+    bytes and every thumbnail is kept on disk in disk_folder, None keeps them
+    in memory only.
+
+    get returns None until the thumbnail is ready, meanwhile the callers
+    draw a placeholder. Once it is, the items that asked for it are updated.
+    Photos that cannot be read are not tried again.
+    """
+    def __init__(self, disk_folder: Optional[str] = None, memory_limit: int = MEMORY_LIMIT, side: int = THUMBNAIL_SIDE, parent: QObject = None):
+        super().__init__(parent)
+        self.disk_folder = disk_folder
+        self.memory_limit = memory_limit
+        self.side = side
+        # relative photo paths are relative to the folder of the family file
+        self.folder = ""
+        self.pool = QThreadPool(self)
+        self.pixmaps: "OrderedDict[str, QPixmap]" = OrderedDict()
+        self.memory_used = 0
+        # path -> id of item -> item to update once the thumbnail is ready
+        self.waiting: Dict[str, Dict[int, object]] = {}
+        self.tasks: Dict[str, ThumbnailTask] = {}
+        # path -> why the photo could not be read
+        self.errors: Dict[str, str] = {}
+        # nothing is evicted while an export holds the thumbnails
+        self.keeping = 0
+
+    def resolve(self, source: str) -> str:
+        return os.path.normpath(os.path.join(self.folder, os.path.expanduser(source)))
+
+    def get(self, source: str, item = None) -> Optional[QPixmap]:
+        """The thumbnail of the photo at source, or None while it is loading
+        or when the photo cannot be read. item is updated once it is ready.
+        """
+        path = self.resolve(source)
+        pixmap = self.pixmaps.get(path)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(path)
+            return pixmap
+        if path in self.errors:
+            return None
+        if item is not None:
+            self.waiting.setdefault(path, {})[id(item)] = item
+        if path not in self.tasks:
+            self.start(path)
+        return None
+
+    def start(self, path: str):
+        task = ThumbnailTask(path, self.side, self.disk_folder)
+        task.signals.finished.connect(self.on_finished)
+        task.signals.failed.connect(self.on_failed)
+        self.tasks[path] = task
+        self.pool.start(task)
+
+    def load_all(self, sources: Iterable[str]):
+        """Loads the thumbnails of every photo before returning. Unless they
+        are kept, the memory limit may drop some of them again.
+        """
+        for source in sources:
+            self.get(source)
+        self.pool.waitForDone()
+        # the results are queued for this object, deliver them now
+        QCoreApplication.sendPostedEvents(self)
+
+    @contextmanager
+    def kept(self, sources: Iterable[str]):
+        """Loads the thumbnails of every photo and keeps all of them in memory
+        until the block ends, past the memory limit, for exports.
+        """
+        self.keeping += 1
+        try:
+            self.load_all(sources)
+            yield
+        finally:
+            self.keeping -= 1
+            self.evict()
+
+    def on_finished(self, path: str, image: QImage):
+        self.tasks.pop(path, None)
+        pixmap = QPixmap.fromImage(image)
+        self.pixmaps[path] = pixmap
+        self.memory_used += self.cost(pixmap)
+        self.evict()
+        self.update_waiting(path)
+
+    def evict(self):
+        if self.keeping:
+            return
+        while self.memory_used > self.memory_limit and len(self.pixmaps) > 1:
+            _, dropped = self.pixmaps.popitem(last=False)
+            self.memory_used -= self.cost(dropped)
+
+    def on_failed(self, path: str, message: str):
+        self.tasks.pop(path, None)
+        self.errors[path] = message
+        self.update_waiting(path)
+
+    def update_waiting(self, path: str):
+        for item in self.waiting.pop(path, {}).values():
+            try:
+                item.update()
+            except RuntimeError:
+                # the item was deleted with its scene meanwhile
+                pass
+
+    @staticmethod
+    def cost(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+_cache: ThumbnailCache = None
+
+def thumbnail_cache() -> ThumbnailCache:
+    """The cache shared by every box, with its disk cache in the user's cache folder."""
+    global _cache
+    if _cache is None:
+        folder = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+        _cache = ThumbnailCache(os.path.join(folder, "thumbnails") if folder else None)
+    return _cache
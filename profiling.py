@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Deque, Dict, List, Tuple
+
+# spans kept for the trace file, older ones are dropped
+MAX_EVENTS: int = 200_000
+
+# switched on by the editor, or for a whole run with FAMILY_TREE_PROFILE=1
+enabled: bool = bool(os.environ.get("FAMILY_TREE_PROFILE"))
+
+_lock = threading.Lock()
+# (name, start in ns, duration in ns, thread id)
+events: Deque[Tuple[str, int, int, int]] = deque(maxlen=MAX_EVENTS)
+# name -> [calls, seconds]
+totals: Dict[str, List[float]] = {}
+counters: Dict[str, int] = {}
+
+def enable(on: bool = True):
+    global enabled
+    enabled = on
+
+def reset():
+    with _lock:
+        events.clear()
+        totals.clear()
+        counters.clear()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        with _lock:
+            events.append((self.name, self.start, duration, threading.get_ident()))
+            total = totals.get(self.name)
+            if total is None:
+                total = totals[self.name] = [0, 0.0]
+            total[0] += 1
+            total[1] += duration / 1e9
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_SPAN = _NoSpan()
+
+def span(name: str):
+    """Context manager timing the block under name, free when profiling is off."""
+    return _Span(name) if enabled else NO_SPAN
+
+def timed(name: str = None):
+    """Decorator timing every call of the function as a span."""
+    def decorate(func):
+        span_name = name or func.__name__
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name: str, n: int = 1):
+    if enabled:
+        with _lock:
+            counters[name] = counters.get(name, 0) + n
+
+def summary(spans: int = 6) -> str:
+    """One line with the spans that took longest in total and every counter."""
+    with _lock:
+        slowest = sorted(totals.items(), key= lambda item: -item[1][1])[:spans]
+        parts = [f"{name} {calls}x {seconds * 1000:.1f} ms" for name, (calls, seconds) in slowest]
+        parts += [f"{name} {value}" for name, value in sorted(counters.items())]
+    return " | ".join(parts)
+
+def write_trace(path: str):
+    """Writes the spans and counters in the Chrome trace event format, which
+    chrome://tracing and Perfetto open.
+    """
+    pid = os.getpid()
+    with _lock:
+        trace = [
+            {"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000, "pid": pid, "tid": tid}
+            for name, start, duration, tid in events
+        ]
+        end = max((start + duration for _, start, duration, _ in events), default=time.perf_counter_ns())
+        trace += [{"name": name, "ph": "C", "ts": end / 1000, "pid": pid, "args": {name: value}} for name, value in counters.items()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,40 @@
+from typing import Callable, Dict, List, Tuple
+from PySide6.QtCore import QObject, QTimer
+
+class RefreshScheduler(QObject):
+    """Collects the parts of the window that need rebuilding and rebuilds
+    each of them once, on the next turn of the event loop.
+
+    Parts are registered with a handler and optionally the parts its rebuild
+    covers, e.g. reloading the tree data also redraws the tree. However many
+    times a part is invalidated before then, its handler runs once.
+    """
+
+    def __init__(self, parent: QObject = None):
+        super().__init__(parent)
+        # (part, handler, covered parts) in the order they are rebuilt
+        self.parts: List[Tuple[str, Callable[[], None], Tuple[str, ...]]] = []
+        self.dirty = set()
+        self.scheduled = False
+        # rebuilds run so far per part, for tests and the profiling overlay
+        self.runs: Dict[str, int] = {}
+
+    def register(self, part: str, handler: Callable[[], None], covers: Tuple[str, ...] = ()):
+        self.parts.append((part, handler, covers))
+        self.runs[part] = 0
+
+    def invalidate(self, *parts: str):
+        self.dirty.update(parts)
+        if not self.scheduled:
+            self.scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def flush(self):
+        """Rebuilds the dirty parts right away, e.g. before an export."""
+        self.scheduled = False
+        dirty, self.dirty = self.dirty, set()
+        for part, handler, covers in self.parts:
+            if part in dirty:
+                dirty.difference_update(covers)
+                self.runs[part] += 1
+                handler()
@@ -0,0 +1,75 @@
+"""Renders family tree charts without opening the editor window.
+
+    python render_charts.py family_info.json --ids 1 7 12 --output-dir charts
+    python render_charts.py family_info.json --all
+
+The file is loaded once and every chart is drawn from the same data, one
+image per reference person named <id>.jpg (or <id>.png with --format png).
+A SQLite database (.db) is read lazily, only the people in the charts are fetched.
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+# has to be set before the QApplication is created
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+from family_graph import FamilyGraph
+from family_io import load_graph
+from family_db import SqliteFamilyGraph, is_database
+from family_tree_view import FamilyTreeView
+from tree_layout import AncestryCycleError
+
+def render_charts(graph: FamilyGraph, ids: List[int], output_dir: str, format: str = "jpg", scale: float = 1.0, depth: int = None) -> int:
+    """Writes one chart per id, returns the number of ids that could not be rendered.
+    depth limits the generations drawn each way, None draws the whole tree.
+    """
+    tree_view = FamilyTreeView(None, depth=depth)
+    try:
+        tree_view.set_people(graph)
+    except AncestryCycleError:
+        # reported below for the ids whose charts run into it
+        pass
+
+    os.makedirs(output_dir, exist_ok=True)
+    failed = 0
+    for id in ids:
+        person = graph.get(id)
+        if person is None:
+            print(f"no person with id {id}", file=sys.stderr)
+            failed += 1
+            continue
+        path = os.path.join(output_dir, f"{id}.{format}")
+        try:
+            tree_view.select_ref(person)
+            tree_view.export_image(path, scale)
+        except ValueError as e:
+            print(f"{id}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(path)
+    return failed
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render family tree charts to images without a window.")
+    parser.add_argument("file", help="family JSON file or SQLite database")
+    parser.add_argument("--ids", type=int, nargs="+", default=[], help="ids of the reference people")
+    parser.add_argument("--all", action="store_true", help="render a chart for every person in the file")
+    parser.add_argument("--output-dir", default=".", help="directory for the rendered images")
+    parser.add_argument("--format", choices=["jpg", "png"], default="jpg", help="image format, png is written in tiles and suits very large trees")
+    parser.add_argument("--depth", type=int, default=None, help="generations drawn each way from the reference person, all by default")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale factor, below 1 downscales the charts")
+    args = parser.parse_args(argv)
+
+    if not args.ids and not args.all:
+        parser.error("give --ids or --all")
+
+    app = QApplication.instance() or QApplication([])
+    graph = SqliteFamilyGraph(args.file) if is_database(args.file) else load_graph(args.file)
+    ids = [p.id for p in graph] if args.all else args.ids
+    return 1 if render_charts(graph, ids, args.output_dir, args.format, args.scale, args.depth) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Generates family trees of any size for benchmarks and manual testing.
+
+    python synthetic_tree.py big_family.json --generations 10 --fan-out 3 --seed 7
+
+The same options and seed always give the same people.
+"""
+import argparse
+import random
+import sys
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from person import Person
+from family_graph import FamilyGraph
+from family_io import save_graph
+
+FIRST_NAMES = ("Anna", "Jan", "Maria", "Piotr", "Ewa", "Tomasz", "Zofia", "Adam", "Helena", "Karol", "Irena", "Marek", "Zoë", "Lukas", "Olga", "Emil")
+LAST_NAMES = ("Nowak", "Kowalski", "Wiśniewski", "Bogel", "Perudo", "Smith", "Dent", "Mazur", "Krawczyk", "Zając", "Wójcik", "Lewandowski")
+FIRST_YEAR: int = 1700
+GENERATION_YEARS: int = 28
+
+@dataclass
+class TreeShape:
+    """Parameters of a generated tree.
+    fan_out is the average number of kids of a couple. remarriage is the
+    chance of someone having kids with a second partner, collapse the chance
+    of a partner being picked among the same generation of the tree rather
+    than coming from outside, which makes cousins marry and ancestors repeat.
+    max_people stops the tree early.
+    """
+    generations: int = 8
+    fan_out: float = 3
+    founders: int = 2
+    remarriage: float = 0.1
+    collapse: float = 0.05
+    max_people: Optional[int] = None
+    seed: int = 1
+
+class TreeGenerator:
+    def __init__(self, shape: TreeShape):
+        self.shape = shape
+        self.random = random.Random(shape.seed)
+        self.people: List[Person] = []
+
+    def full(self) -> bool:
+        return self.shape.max_people is not None and len(self.people) >= self.shape.max_people
+
+    def new_person(self, generation: int, last_name: str = None) -> Person:
+        rng = self.random
+        year = FIRST_YEAR + generation * GENERATION_YEARS + rng.randint(-5, 5)
+        person = Person(
+            len(self.people) + 1, rng.choice(FIRST_NAMES), rng.choice(FIRST_NAMES) if rng.random() < 0.3 else "",
+            last_name or rng.choice(LAST_NAMES), "", f"{year}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}",
+            f"{year + rng.randint(30, 90)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}", "", ""
+        )
+        self.people.append(person)
+        return person
+
+    def couple(self, a: Person, b: Person) -> Tuple[Person, Person]:
+        a.partners.append(b.id)
+        b.partners.append(a.id)
+        return a, b
+
+    def kids_of(self, couple: Tuple[Person, Person], generation: int) -> List[Person]:
+        spread = self.shape.fan_out
+        count = max(0, round(self.random.uniform(spread - 1.5, spread + 1.5)))
+        kids = []
+        for _ in range(count):
+            if self.full():
+                break
+            kid = self.new_person(generation, couple[0].last_name)
+            for parent in couple:
+                parent.kids.append(kid.id)
+                kid.parents.append(parent.id)
+            kids.append(kid)
+        return kids
+
+    def pair_up(self, kids: List[Person], generation: int) -> List[Tuple[Person, Person]]:
+        """Finds partners for a generation, returns the couples having kids."""
+        rng = self.random
+        couples = []
+        single = [kid for kid in kids if rng.random() < self.shape.collapse]
+        for kid in kids:
+            if kid.partners or self.full():
+                continue
+            # a partner from the tree itself, anyone but a sibling
+            partner = next((x for x in single if x is not kid and not x.partners and not set(x.parents) & set(kid.parents)), None)
+            if partner is None:
+                partner = self.new_person(generation)
+            couples.append(self.couple(kid, partner))
+            if rng.random() < self.shape.remarriage and not self.full():
+                couples.append(self.couple(kid, self.new_person(generation)))
+        return couples
+
+    def generate(self) -> List[Person]:
+        couples = [self.couple(self.new_person(0), self.new_person(0)) for _ in range(self.shape.founders)]
+        for generation in range(1, self.shape.generations):
+            kids = [kid for couple in couples for kid in self.kids_of(couple, generation)]
+            self.random.shuffle(kids)
+            if generation == self.shape.generations - 1:
+                break
+            couples = self.pair_up(kids, generation)
+        return self.people
+
+def generate_tree(shape: TreeShape = None) -> List[Person]:
+    return TreeGenerator(shape or TreeShape()).generate()
+
+def shape_arguments(parser: argparse.ArgumentParser):
+    """Adds the TreeShape options, shared with the benchmark."""
+    defaults = TreeShape()
+    parser.add_argument("--generations", type=int, default=defaults.generations, help="number of generations")
+    parser.add_argument("--fan-out", type=float, default=defaults.fan_out, help="average number of kids of a couple")
+    parser.add_argument("--founders", type=int, default=defaults.founders, help="couples of the first generation")
+    parser.add_argument("--remarriage", type=float, default=defaults.remarriage, help="chance of a second partner with kids")
+    parser.add_argument("--collapse", type=float, default=defaults.collapse, help="chance of a partner from within the tree")
+    parser.add_argument("--max-people", type=int, default=None, help="stop once the tree has this many people")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="random seed")
+
+def shape_from_arguments(args: argparse.Namespace) -> TreeShape:
+    return TreeShape(args.generations, args.fan_out, args.founders, args.remarriage, args.collapse, args.max_people, args.seed)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a generated family tree as family JSON.")
+    parser.add_argument("output", help="JSON file to write")
+    shape_arguments(parser)
+    args = parser.parse_args(argv)
+
+    people = generate_tree(shape_from_arguments(args))
+    save_graph(args.output, FamilyGraph(people))
+    print(f"{len(people)} people written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
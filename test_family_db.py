@@ -0,0 +1,39 @@
+from family_db import SqliteFamilyGraph, import_json
+from family_graph import FamilyGraph
+from family_io import save_graph
+from person import Person
+
+def person(id: int, name: str, **relations) -> Person:
+    return Person(id, name, "", "", "", "", "", "", "", **relations)
+
+def family() -> FamilyGraph:
+    return FamilyGraph([
+        person(1, "Father", partners=[2], kids=[3]),
+        person(2, "Mother", partners=[1], kids=[3]),
+        person(3, "Kid", parents=[1, 2]),
+    ])
+
+def test_remove_round_trip(tmp_path):
+    json_path, db_path = str(tmp_path / "family.json"), str(tmp_path / "family.db")
+    save_graph(json_path, family())
+    graph = import_json(json_path, db_path)
+    seen = []
+    graph.register_callback(lambda action, p: seen.append((action, p.id, p.id in graph)))
+    touched = graph.remove(graph.get(1))
+    assert sorted(p.id for p in touched) == [2, 3]
+    # listeners run once the row is gone
+    assert seen[0] == ("remove", 1, False)
+    graph.close()
+
+    reopened = SqliteFamilyGraph(db_path)
+    assert len(reopened) == 2 and 1 not in reopened
+    assert reopened.get(2).partners == [] and reopened.get(2).kids == [3]
+    assert reopened.get(3).parents == [2]
+    assert reopened.conn.execute("SELECT COUNT(*) FROM relations WHERE other_id = 1 OR person_id = 1").fetchone()[0] == 0
+    reopened.close()
+
+def test_remove_unknown_person_leaves_no_state(tmp_path):
+    graph = SqliteFamilyGraph(str(tmp_path / "family.db"))
+    assert graph.remove(person(99, "Nobody", parents=[1])) == []
+    assert 99 not in graph.parents and 99 not in graph.kids and 99 not in graph.partners
+    graph.close()
@@ -0,0 +1,124 @@
+import io
+import json
+import threading
+import pytest
+import family_io
+from family_graph import FamilyGraph
+from family_io import EditJournal, PeopleStreamReader, iter_people, load_graph, save_graph
+from person import Person
+
+def person(id: int, name: str, **relations) -> Person:
+    return Person(id, name, "", "", "", "", "", "", "", **relations)
+
+def family_file(tmp_path) -> str:
+    filename = str(tmp_path / "family.json")
+    save_graph(filename, FamilyGraph([
+        person(1, "Father", kids=[3]),
+        person(2, "Mother", kids=[3]),
+        person(3, "Kid", parents=[1, 2]),
+    ]))
+    return filename
+
+def names(graph: FamilyGraph) -> dict:
+    return {p.id: p.name for p in graph}
+
+def saved_names(filename: str) -> dict:
+    return {p.id: p.name for batch in iter_people(filename) for p in batch}
+
+# =======================
+# STREAM READER
+# =======================
+
+def read(data) -> list:
+    return list(PeopleStreamReader(io.BytesIO(json.dumps(data, ensure_ascii=False).encode("utf-8"))).people())
+
+PEOPLE = [
+    {"id": 1, "name": "Zo\u00eb", "last_name": "Wi\u015bniewska", "kids": [2, 30]},
+    # four byte characters get split across the tiny chunks
+    {"id": 2, "name": "\U0001F333 \u017bebrowski", "notes": "a \\\"quoted\\\" [note]"},
+    {"id": 1234567890, "name": "", "parents": []},
+]
+
+@pytest.mark.parametrize("chunk_size", range(1, 18))
+def test_stream_reader_with_tiny_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(family_io, "CHUNK_SIZE", chunk_size)
+    # numbers cut at the end of the buffer, keys before and after the people
+    data = {"version": 123456789, "title": "R\u00f3d", "people": PEOPLE, "after": {"people": [1], "n": 9876543}, "last": 10}
+    assert read(data) == PEOPLE
+    assert read({"people": []}) == []
+    assert read({"before": [{"a": 1}], "people": [], "after": 1.5}) == []
+
+def test_stream_reader_rejects_a_truncated_file():
+    data = json.dumps({"people": PEOPLE}).encode("utf-8")[:-10]
+    with pytest.raises(ValueError):
+        list(PeopleStreamReader(io.BytesIO(data)).people())
+
+# =======================
+# JOURNAL
+# =======================
+
+def test_edits_are_replayed_on_load(tmp_path):
+    filename = family_file(tmp_path)
+    graph = load_graph(filename)
+    journal = EditJournal(filename, graph)
+    graph.add(person(4, "Aunt"))
+    graph.get(1).name = "Dad"
+    graph.update(graph.get(1))
+    graph.remove(graph.get(2))
+    journal.close()
+
+    # the family file itself is untouched, the edits live in the journal
+    assert saved_names(filename) == {1: "Father", 2: "Mother", 3: "Kid"}
+    loaded = load_graph(filename)
+    assert names(loaded) == {1: "Dad", 3: "Kid", 4: "Aunt"}
+    assert loaded.get(3).parents == [1]
+
+def test_compaction_folds_the_journal_and_keeps_new_edits(tmp_path, monkeypatch):
+    filename = family_file(tmp_path)
+    graph = load_graph(filename)
+    release = threading.Event()
+    fold = EditJournal.fold
+    def held_fold(self):
+        release.wait(5)
+        fold(self)
+    monkeypatch.setattr(EditJournal, "fold", held_fold)
+
+    journal = EditJournal(filename, graph, compact_size=1)
+    graph.add(person(4, "Aunt"))
+    assert journal.is_compacting()
+    # made while the first journal is being folded
+    graph.add(person(5, "Uncle"))
+    with open(journal.journal_name, encoding="utf-8") as f:
+        assert [json.loads(line)["put"]["id"] for line in f] == [5]
+    assert names(load_graph(filename)) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt", 5: "Uncle"}
+
+    release.set()
+    journal.compact_thread.join()
+    assert not (tmp_path / "family.json.journal.compacting").exists()
+    assert saved_names(filename) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt"}
+    journal.close()
+    assert names(load_graph(filename)) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt", 5: "Uncle"}
+
+def test_leftover_compaction_is_recovered(tmp_path):
+    filename = family_file(tmp_path)
+    # an interrupted compaction left its journal behind
+    with open(filename + ".journal.compacting", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"put": person(4, "Aunt").to_dict()}) + "\n")
+    graph = load_graph(filename)
+    assert names(graph) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt"}
+
+    journal = EditJournal(filename, graph, compact_size=1)
+    graph.add(person(5, "Uncle"))
+    journal.compact_thread.join()
+    journal.close()
+    assert not (tmp_path / "family.json.journal.compacting").exists()
+    assert saved_names(filename) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt"}
+    assert names(load_graph(filename)) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt", 5: "Uncle"}
+
+def test_truncated_record_ends_replay(tmp_path):
+    filename = family_file(tmp_path)
+    with open(filename + ".journal", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"put": person(4, "Aunt").to_dict()}) + "\n")
+        f.write('{"put": {"id": 5, "na\n')
+        f.write(json.dumps({"remove": 1}) + "\n")
+    assert names(load_graph(filename)) == {1: "Father", 2: "Mother", 3: "Kid", 4: "Aunt"}
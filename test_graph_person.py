@@ -0,0 +1,19 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QGraphicsScene, QGraphicsView
+from graph_person import GraphPerson
+from person import Person
+
+app = QApplication.instance() or QApplication([])
+
+def test_new_person_repaints_the_cached_box():
+    scene = QGraphicsScene()
+    box = GraphPerson(Person(1, "Anna", "", "Nowak", "", "1900", "", "", ""), None)
+    scene.addItem(box)
+    view = QGraphicsView(scene)
+    view.resize(300, 200)
+    before = view.viewport().grab().toImage()
+    assert view.viewport().grab().toImage() == before
+    box.set_person(Person(2, "Jan", "", "Kowalski", "", "1950", "2000", "", ""))
+    assert view.viewport().grab().toImage() != before
@@ -0,0 +1,62 @@
+from family_graph import FamilyGraph
+from integrity import CYCLE, DANGLING, DUPLICATE_ID, ONE_SIDED, REPEATED, SELF_LINK, check_graph, find_cycles, repair
+from person import Person
+
+def person(id: int, name: str = "", **relations) -> Person:
+    return Person(id, name or f"P{id}", "", "", "", "", "", "", "", **relations)
+
+def kinds(issues) -> list:
+    return sorted((issue.kind, issue.person_id, issue.relation, issue.other_id) for issue in issues)
+
+def test_sound_graph_has_no_issues():
+    graph = FamilyGraph([person(1, partners=[2], kids=[3]), person(2, partners=[1], kids=[3]), person(3, parents=[1, 2])])
+    assert check_graph(graph) == []
+
+def test_dangling():
+    graph = FamilyGraph([person(1, kids=[9])])
+    assert kinds(check_graph(graph)) == [(DANGLING, 1, "kids", 9)]
+
+def test_one_sided():
+    graph = FamilyGraph([person(1, kids=[2]), person(2)])
+    assert kinds(check_graph(graph)) == [(ONE_SIDED, 1, "kids", 2)]
+
+def test_self_link():
+    graph = FamilyGraph([person(1, partners=[1])])
+    assert kinds(check_graph(graph)) == [(SELF_LINK, 1, "partners", 1)]
+
+def test_repeated_link_is_reported_once():
+    # a missing back link listed twice is one problem, not two
+    graph = FamilyGraph([person(1, parents=[2, 2]), person(2)])
+    assert kinds(check_graph(graph)) == [(ONE_SIDED, 1, "parents", 2), (REPEATED, 1, "parents", 2)]
+
+def test_duplicate_id():
+    dropped = person(1, "Dropped")
+    graph = FamilyGraph([person(1, "Kept")])
+    assert kinds(check_graph(graph, [dropped])) == [(DUPLICATE_ID, 1, "", None)]
+
+def test_cycle():
+    graph = FamilyGraph([person(1, parents=[3], kids=[2]), person(2, parents=[1], kids=[3]), person(3, parents=[2], kids=[1])])
+    cycles = find_cycles(graph)
+    assert len(cycles) == 1 and cycles[0].kind == CYCLE
+    assert cycles[0].path[0] == cycles[0].path[-1] and sorted(cycles[0].path[:-1]) == [1, 2, 3]
+    assert [issue.kind for issue in check_graph(graph)] == [CYCLE]
+
+def test_repair_leaves_no_issues():
+    graph = FamilyGraph([
+        person(1, kids=[2, 2, 9], partners=[1]),
+        person(2, kids=[3]),
+        person(3, parents=[2], kids=[2]),
+        person(4, partners=[1]),
+    ])
+    graph.get(2).parents.append(3)
+    graph.update(graph.get(2))
+    dropped = person(3, "Dropped", parents=[1])
+    issues = check_graph(graph, [dropped])
+    assert {issue.kind for issue in issues} == {DANGLING, ONE_SIDED, SELF_LINK, REPEATED, DUPLICATE_ID, CYCLE}
+
+    changed = repair(graph, issues)
+    assert check_graph(graph) == []
+    # the dropped person is back under a new id without relations
+    added = [p for p in changed if p.name == "Dropped"]
+    assert len(added) == 1 and added[0].id not in (1, 2, 3, 4) and added[0].parents == []
+    assert graph.get(1).kids == [2] and graph.get(1).partners == [4]
@@ -0,0 +1,64 @@
+from family_graph import FamilyGraph
+from people_index import PeopleIndex
+from person import Person
+
+def person(id: int, name: str, last_name: str = "") -> Person:
+    return Person(id, name, "", last_name, "", "", "", "", "")
+
+def family() -> FamilyGraph:
+    return FamilyGraph([
+        person(1, "Joanne", "Smith"),
+        person(2, "Annabel", "Smith"),
+        person(3, "Ann", "Smith"),
+        person(4, "Anna", "Brown"),
+        person(5, "Peter", "Brown"),
+    ])
+
+def test_search_order():
+    index = PeopleIndex(family())
+    # whole words, then prefixes, then inside words, each group by name
+    assert index.search("ann") == [3, 4, 2, 1]
+    assert index.search("ann smith") == [3, 2, 1]
+    assert index.search("eter") == [5]
+    assert index.search("zoe") == []
+    index.close()
+
+def test_short_terms_skip_inside_words():
+    index = PeopleIndex(family())
+    assert index.search("an") == [4, 3, 2]
+    index.close()
+
+def test_accents_are_ignored():
+    graph = family()
+    graph.add(person(6, "Zoë", "Brown"))
+    index = PeopleIndex(graph)
+    assert index.search("zoe") == [6]
+    assert index.search("ZOË") == [6]
+    index.close()
+
+def test_update_add_and_remove():
+    graph = family()
+    index = PeopleIndex(graph)
+    peter = graph.get(5)
+    peter.name = "Annette"
+    graph.update(peter)
+    assert index.search("peter") == []
+    assert index.search("annette") == [5]
+    # the old words left the token list and the trigram map
+    assert "peter" not in index.tokens and "ete" not in index.trigram_tokens
+
+    graph.add(person(6, "Hannah", "Green"))
+    # ordered by last name first
+    assert index.search("ann") == [3, 4, 5, 2, 6, 1]
+
+    graph.remove(graph.get(3))
+    assert index.search("ann") == [4, 5, 2, 6, 1]
+    assert 3 not in index.entries
+    index.close()
+
+def test_close_stops_updates():
+    graph = family()
+    index = PeopleIndex(graph)
+    index.close()
+    graph.add(person(6, "Hannah", "Green"))
+    assert index.search("hannah") == []
@@ -0,0 +1,13 @@
+from person import Person
+
+def test_from_dict_accepts_null_and_numeric_names():
+    person = Person.from_dict({"id": 1, "name": None, "middle_name": None, "last_name": 7, "family_name": None})
+    assert person.name == ""
+    assert person.middle_name == ""
+    assert person.last_name == "7"
+    assert person.family_name == ""
+
+def test_names_are_interned():
+    a = Person.from_dict({"id": 1, "name": "".join(["Ja", "n"])})
+    b = Person.from_dict({"id": 2, "name": "".join(["J", "an"])})
+    assert a.name is b.name
@@ -0,0 +1,47 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QColor, QImage
+import photo_thumbnails
+from photo_thumbnails import THUMBNAIL_SIDE, ThumbnailCache
+from person import Person
+from family_graph import FamilyGraph
+from family_tree_view import FamilyTreeView
+from graph_person import box_style
+
+app = QApplication.instance() or QApplication([])
+
+COLORS = ("#ff0000", "#00ff00", "#0000ff")
+
+def colors_of(image: QImage) -> set:
+    image = image.convertToFormat(QImage.Format_RGB32)
+    return {image.pixelColor(x, y).name() for y in range(image.height()) for x in range(image.width())}
+
+def test_export_keeps_every_photo(tmp_path, monkeypatch):
+    photos = []
+    for i, color in enumerate(COLORS):
+        image = QImage(THUMBNAIL_SIDE, THUMBNAIL_SIDE, QImage.Format_RGB32)
+        image.fill(QColor(color))
+        path = str(tmp_path / f"{i}.png")
+        image.save(path)
+        photos.append(path)
+    people = [
+        Person(1, "A", "", "", "", "", "", "", photos[0], partners=[2], kids=[3]),
+        Person(2, "B", "", "", "", "", "", "", photos[1], partners=[1], kids=[3]),
+        Person(3, "C", "", "", "", "", "", "", photos[2], parents=[1, 2]),
+    ]
+    # room for a single thumbnail, the export needs all three
+    cache = ThumbnailCache(None, memory_limit=THUMBNAIL_SIDE * THUMBNAIL_SIDE * 4)
+    monkeypatch.setattr(photo_thumbnails, "_cache", cache)
+
+    tree_view = FamilyTreeView(None)
+    tree_view.select_ref(people[2])
+    tree_view.set_people(FamilyGraph(people))
+    output = str(tmp_path / "tree.png")
+    tree_view.export_image(output)
+
+    colors = colors_of(QImage(output))
+    assert box_style().silhouette_brush.color().name() not in colors
+    assert set(COLORS) <= colors
+    assert cache.memory_used <= cache.memory_limit
@@ -0,0 +1,82 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QMessageBox
+from PySide6.QtCore import QThreadPool
+from family_graph import FamilyGraph
+from family_io import save_graph
+from person import Person
+from refresh_scheduler import RefreshScheduler
+
+app = QApplication.instance() or QApplication([])
+
+def settle():
+    """Runs the deferred rebuilds and the tree plans they start."""
+    for _ in range(3):
+        QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+
+def scheduler_with_log():
+    scheduler = RefreshScheduler()
+    log = []
+    scheduler.register("people", lambda: log.append("people"), covers=("tree",))
+    scheduler.register("tree", lambda: log.append("tree"))
+    scheduler.register("editor", lambda: log.append("editor"))
+    return scheduler, log
+
+def test_invalidations_coalesce_on_the_next_turn():
+    scheduler, log = scheduler_with_log()
+    for _ in range(5):
+        scheduler.invalidate("tree")
+        scheduler.invalidate("editor")
+    assert log == []
+    app.processEvents()
+    assert log == ["tree", "editor"]
+    assert scheduler.runs == {"people": 0, "tree": 1, "editor": 1}
+    app.processEvents()
+    assert log == ["tree", "editor"]
+
+def test_covered_parts_are_not_rebuilt_again():
+    scheduler, log = scheduler_with_log()
+    scheduler.invalidate("tree")
+    scheduler.invalidate("people")
+    scheduler.flush()
+    assert log == ["people"]
+    assert scheduler.runs["tree"] == 0
+    # the timer started by invalidate finds nothing left to do
+    app.processEvents()
+    assert log == ["people"]
+
+def test_each_action_lays_the_tree_out_once(tmp_path, monkeypatch):
+    save_graph(str(tmp_path / "family_info.json"), FamilyGraph([
+        Person(1, "Father", "", "", "", "", "", "", "", partners=[2], kids=[3]),
+        Person(2, "Mother", "", "", "", "", "", "", "", partners=[1], kids=[3]),
+        Person(3, "Kid", "", "", "", "", "", "", "", parents=[1, 2]),
+    ]))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(QMessageBox, "question", staticmethod(lambda *args: QMessageBox.Yes))
+    from main import FamilyEditor
+    window = FamilyEditor()
+    settle()
+    tree_view = window.tree_view
+
+    def layouts_of(action) -> int:
+        before = tree_view.layouts
+        action()
+        settle()
+        return tree_view.layouts - before
+
+    assert layouts_of(lambda: window.select_person(window.graph.get(3))) == 1
+
+    def save():
+        window.person_editor.name_edit.setText("Renamed")
+        window.person_editor.save_changes()
+    assert layouts_of(save) == 1
+    assert window.graph.get(3).name == "Renamed"
+
+    assert layouts_of(window.add_person) == 1
+    assert len(window.graph) == 4
+
+    assert layouts_of(window.remove_person) == 1
+    assert len(window.graph) == 3
+    window.close()
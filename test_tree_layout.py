@@ -0,0 +1,83 @@
+import pytest
+from person import Person
+from family_graph import FamilyGraph
+from synthetic_tree import TreeShape, generate_tree
+from tree_layout import MARGIN, MARGIN_UNITS, PERSON_WIDTH, AncestryCycleError, LayoutUnit, plan_tree
+
+def person(id: int, name: str, **relations) -> Person:
+    return Person(id, name, "", "", "", "", "", "", "", **relations)
+
+def test_partner_twice_in_ancestry_is_not_a_cycle():
+    # W marries H and, after H dies, H's father F, C is the child of H and W
+    f = person(1, "F", partners=[3], kids=[2])
+    h = person(2, "H", partners=[3], parents=[1], kids=[4])
+    w = person(3, "W", partners=[2, 1], kids=[4])
+    c = person(4, "C", parents=[2, 3])
+    graph = FamilyGraph([f, h, w, c])
+    for ref in (f, h, w, c):
+        for depth in (None, 4):
+            plan_tree(graph, ref, depth)
+
+def test_ancestry_cycle_is_reported():
+    a = person(1, "A", parents=[2], kids=[2])
+    b = person(2, "B", parents=[1], kids=[1])
+    with pytest.raises(AncestryCycleError):
+        plan_tree(FamilyGraph([a, b]), a, None)
+
+# =======================
+# LAYOUT
+# =======================
+
+def generated_plan():
+    people = generate_tree(TreeShape(generations=5, fan_out=2.5, seed=3))
+    graph = FamilyGraph(people)
+    ref = next(p for p in people if p.parents and p.kids)
+    return graph, ref, plan_tree(graph, ref, None)
+
+def descendant_units(plan):
+    return [unit for branch in plan.branches for unit in branch.root.walk(with_children=True)]
+
+def test_partners_are_drawn_side_by_side():
+    graph, ref, plan = generated_plan()
+    couples = [unit for unit in descendant_units(plan) if len(unit.heads) > 1]
+    assert couples
+    for unit in couples:
+        for index in range(1, len(unit.heads)):
+            assert unit.head_x(index) - unit.head_x(index - 1) == PERSON_WIDTH + MARGIN
+        assert unit.x <= unit.head_x(0) and unit.head_x(len(unit.heads) - 1) + PERSON_WIDTH <= unit.x + unit.width
+
+def test_parents_are_centered_over_their_children():
+    graph, ref, plan = generated_plan()
+    # the root of a branch is moved under the parents drawn by the ancestors
+    roots = [branch.root for branch in plan.branches]
+    parents = [unit for unit in descendant_units(plan) if unit.children and unit not in roots]
+    assert parents
+    for unit in parents:
+        heads_center = unit.head_x() + unit.heads_width / 2
+        first, last = unit.children[0], unit.children[-1]
+        assert abs(heads_center - (first.x + last.x + last.width) / 2) < 1e-6
+        assert all(child.y > unit.y for child in unit.children)
+
+def test_sibling_subtrees_do_not_overlap():
+    graph, ref, plan = generated_plan()
+    for unit in descendant_units(plan):
+        for left, right in zip(unit.children, unit.children[1:]):
+            assert left.x + left.width + MARGIN_UNITS <= right.x
+        # every subtree stays inside the slot of its root
+        for child in unit.children:
+            for below in child.walk(with_children=True):
+                assert child.x <= below.x and below.x + below.width <= child.x + child.width + 1e-6
+
+def test_width_cache_is_dropped_when_units_are_added():
+    root = LayoutUnit([person(1, "Root")])
+    kid = LayoutUnit([person(2, "Kid")])
+    root.add_children([kid])
+    assert root.get_width(False, True) == PERSON_WIDTH
+
+    # the kid's new partner widens the kid and, through it, the root
+    kid.heads.append(person(3, "Partner"))
+    kid.heads_width = 2 * PERSON_WIDTH + MARGIN
+    kid.add_children([LayoutUnit([person(4, "Grandkid")]), LayoutUnit([person(5, "Grandkid")])])
+    assert root.get_width(False, True) == 2 * PERSON_WIDTH + MARGIN_UNITS
+    root.add_children([LayoutUnit([person(6, "Kid")])])
+    assert root.get_width(False, True) == 3 * PERSON_WIDTH + 2 * MARGIN_UNITS
@@ -0,0 +1,25 @@
+import pytest
+import tree_planner
+from person import Person
+from family_graph import FamilyGraph
+from tree_planner import TreePlanTask
+
+def run_task(monkeypatch, error: Exception) -> list:
+    def plan_tree(*args):
+        raise error
+    monkeypatch.setattr(tree_planner, "plan_tree", plan_tree)
+    person = Person(1, "A", "", "", "", "", "", "", "")
+    task = TreePlanTask(FamilyGraph([person]), person, 7)
+    failures = []
+    task.signals.failed.connect(lambda generation, message: failures.append((generation, message)))
+    task.signals.finished.connect(lambda generation, plan: failures.append("finished"))
+    task.run()
+    return failures
+
+@pytest.mark.parametrize("error, message", [
+    (ValueError("bad tree"), "bad tree"),
+    (KeyError(5), "5"),
+    (StopIteration(), "StopIteration"),
+])
+def test_every_error_is_reported(monkeypatch, error, message):
+    assert run_task(monkeypatch, error) == [(7, message)]
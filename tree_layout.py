@@ -0,0 +1,404 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+from person import Person
+from family_graph import FamilyGraph
+import profiling
+
+# generations shown each way from the reference person before the tree has to be expanded
+DEFAULT_DEPTH: int = 4
+# Qt independent geometry of the tree, GraphPerson and FamilyUnit use the same values
+PERSON_WIDTH: int = 150
+PERSON_HEIGHT: int = 80
+MARGIN: int = 20
+MARGIN_UNITS: int = 80
+GEN_OFFSET: int = PERSON_HEIGHT + MARGIN_UNITS
+
+class AncestryCycleError(ValueError):
+    """Someone is their own ancestor in the data, so the tree has no end."""
+
+    def __init__(self, people: List[Person]):
+        self.people = people
+        super().__init__("ancestry cycle: " + " -> ".join(f"{person.name or '(Unnamed)'} ({person.id})" for person in people))
+
+class PlanCancelled(Exception):
+    """Raised inside a build whose cancelled callback returned True."""
+
+class LayoutUnit:
+    """A couple (or single person) with links to its parents and children units.
+    x and y are the top left corner of the slot reserved for the unit and its
+    subtree, relative to the origin of the tree it belongs to.
+    A couple reached again through another line of the tree is built once,
+    later occurrences are leaves with repeat_of pointing at the first one.
+    more_parents and more_children mark units at the depth limit with more
+    generations beyond it.
+    """
+    __slots__ = ("heads", "heads_width", "parents", "children", "x", "y", "width", "heads_x", "visible", "width_cache", "repeat_of", "more_parents", "more_children")
+
+    def __init__(self, heads: List[Person]):
+        self.heads: List[Person] = sorted(heads, key= lambda person: person.id) if len(heads) > 1 else heads
+        self.heads_width: float = len(heads) * PERSON_WIDTH + (len(heads) - 1) * MARGIN if heads else 0
+        self.parents: List["LayoutUnit"] = []
+        self.children: List["LayoutUnit"] = []
+        self.x: float = 0
+        self.y: float = 0
+        self.width: float = 0
+        self.heads_x: float = 0
+        self.visible: bool = True
+        # widths keyed by (with_parents, with_children), see get_width
+        self.width_cache = {}
+        self.repeat_of: Optional[LayoutUnit] = None
+        self.more_parents: bool = False
+        self.more_children: bool = False
+
+    @classmethod
+    def for_person(cls, person: Person, graph: FamilyGraph) -> "LayoutUnit":
+        heads = [person] + graph.partners_of(person)
+        profiling.count("units built")
+        profiling.count("people scanned", len(heads))
+        return cls(heads)
+
+    @property
+    def key(self) -> tuple:
+        return tuple(head.id for head in self.heads)
+
+    def head_x(self, index: int = 0) -> float:
+        return self.x + self.heads_x + index * (PERSON_WIDTH + MARGIN)
+
+    def find_child(self, person: Person) -> "LayoutUnit":
+        return next(x for x in self.children if any(head.id == person.id for head in x.heads))
+
+    def add_children(self, units: List["LayoutUnit"]):
+        self.children += units
+        for unit in units:
+            unit.parents.append(self)
+            if unit.width_cache:
+                unit.invalidate_width(parents_changed=True, children_changed=False)
+        if self.width_cache:
+            self.invalidate_width(parents_changed=False, children_changed=True)
+
+    def add_parents(self, units: List["LayoutUnit"]):
+        self.parents += units
+        for unit in units:
+            unit.children.append(self)
+            if unit.width_cache:
+                unit.invalidate_width(parents_changed=False, children_changed=True)
+        if self.width_cache:
+            self.invalidate_width(parents_changed=True, children_changed=False)
+
+    def invalidate_width(self, parents_changed: bool = True, children_changed: bool = True):
+        """Drops cached widths that depend on this unit.
+        Descendant widths are summed up into parent units and ancestor widths
+        into children units, so only that path towards the root is cleared.
+        A unit is cached only after everything it sums up is cached, so the
+        walk stops at the first unit without a cached width.
+        """
+        self.width_cache.pop((True, True), None)
+        if children_changed and self.width_cache.pop((False, True), None) is not None:
+            for unit in self.parents:
+                unit.invalidate_width(parents_changed=False, children_changed=True)
+        if parents_changed and self.width_cache.pop((True, False), None) is not None:
+            for unit in self.children:
+                unit.invalidate_width(parents_changed=True, children_changed=False)
+
+    def get_width(self, with_parents = False, with_children = False) -> float:
+        key = (with_parents, with_children)
+        width = self.width_cache.get(key)
+        if width is None:
+            width = self.width_cache[key] = self.compute_width(with_parents, with_children)
+        return width
+
+    def compute_width(self, with_parents = False, with_children = False) -> float:
+        profiling.count("widths computed")
+        children_width = 0
+        if with_children:
+            for unit in self.children:
+                children_width += unit.get_width(False, with_children)
+            if len(self.children) > 0:
+                children_width += (len(self.children) - 1) * MARGIN_UNITS
+
+        parents_width = 0
+        if with_parents:
+            for unit in self.parents:
+                parents_width += unit.get_width(with_parents, False)
+            if len(self.parents) > 0:
+                parents_width += (len(self.parents) - 1) * MARGIN_UNITS
+
+        return max(children_width, parents_width, self.heads_width)
+
+    def walk(self, with_parents = False, with_children = False) -> List["LayoutUnit"]:
+        """Returns this unit and every unit reachable in the given direction."""
+        units: List[LayoutUnit] = []
+        stack: List[LayoutUnit] = [self]
+        while stack:
+            unit = stack.pop()
+            units.append(unit)
+            if with_parents:
+                stack += reversed(unit.parents)
+            if with_children:
+                stack += reversed(unit.children)
+        return units
+
+    def hide(self):
+        """Hides this unit together with its children units."""
+        for unit in self.walk(with_children=True):
+            unit.visible = False
+
+# =======================
+# BUILDING
+# =======================
+
+class _TreeBuilder:
+    """State of one build: the couples built so far, the people on the path
+    being walked and the generation limits.
+    depth is the number of generations built from a root or from an expanded
+    unit, None builds everything.
+    """
+
+    def __init__(self, graph: FamilyGraph, depth: Optional[int] = None, expanded: Set[tuple] = frozenset(), cancelled: Callable[[], bool] = None):
+        self.graph = graph
+        self.depth = depth
+        self.expanded = expanded
+        self.cancelled = cancelled
+        self.built: Dict[tuple, LayoutUnit] = {}
+        self.path: List[Person] = []
+        # ids of the people on path, partners are not part of the blood line
+        self.path_ids: Set[int] = set()
+
+    def is_repeat(self, unit: LayoutUnit) -> bool:
+        if self.cancelled and self.cancelled():
+            raise PlanCancelled()
+        first = self.built.get(unit.key)
+        if first is None:
+            self.built[unit.key] = unit
+            return False
+        unit.repeat_of = first
+        return True
+
+    def generations_left(self, unit: LayoutUnit, left: Optional[int]) -> Optional[int]:
+        if left is None or unit.key not in self.expanded:
+            return left
+        return max(left, self.depth)
+
+    def ancestors(self, person: Person, left: Optional[int]) -> LayoutUnit:
+        graph = self.graph
+        if person.id in self.path_ids:
+            raise AncestryCycleError(self.path + [person])
+        unit = LayoutUnit.for_person(person, graph)
+        if self.is_repeat(unit):
+            return unit
+
+        parent_ids_list = [parent_ids[:1] for parent_ids in [graph.parents.get(head.id) for head in unit.heads] if parent_ids]
+        left = self.generations_left(unit, left)
+        if left == 0:
+            unit.more_parents = len(graph.resolve(id for ids in parent_ids_list for id in ids)) > 0
+            return unit
+
+        self.path.append(person)
+        self.path_ids.add(person.id)
+        units: List[LayoutUnit] = []
+        for parent_ids in parent_ids_list:
+            for parent in graph.resolve(parent_ids):
+                units.append(self.ancestors(parent, None if left is None else left - 1))
+        self.path.pop()
+        self.path_ids.discard(person.id)
+
+        unit.add_parents(units)
+        return unit
+
+    def descendants(self, person: Person, left: Optional[int], move_child_right: int = None, move_child_left: int = None) -> LayoutUnit:
+        if person.id in self.path_ids:
+            raise AncestryCycleError(self.path + [person])
+        graph = self.graph
+        unit = LayoutUnit.for_person(person, graph)
+        if self.is_repeat(unit):
+            return unit
+
+        kid_ids = list(graph.kids.get(person.id, []))
+        if move_child_right and move_child_right in kid_ids:
+            kid_ids.remove(move_child_right)
+            kid_ids.append(move_child_right)
+
+        if move_child_left and move_child_left in kid_ids:
+            kid_ids.remove(move_child_left)
+            kid_ids.insert(0,move_child_left)
+
+        left = self.generations_left(unit, left)
+        if left == 0:
+            unit.more_children = len(graph.resolve(kid_ids)) > 0
+            return unit
+
+        self.path.append(person)
+        self.path_ids.add(person.id)
+        unit.add_children([self.descendants(kid, None if left is None else left - 1, move_child_right, move_child_left) for kid in graph.resolve(kid_ids)])
+        self.path.pop()
+        self.path_ids.discard(person.id)
+        return unit
+
+@profiling.timed()
+def build_ancestors(person: Person, graph: FamilyGraph, depth: Optional[int] = None, expanded: Set[tuple] = frozenset(), cancelled: Callable[[], bool] = None) -> LayoutUnit:
+    """Builds the ancestors of person, each couple once, up to depth generations
+    above person and depth more above every unit whose key is in expanded.
+    Raises AncestryCycleError if a person is their own ancestor and
+    PlanCancelled once cancelled() returns True.
+    """
+    return _TreeBuilder(graph, depth, expanded, cancelled).ancestors(person, depth)
+
+@profiling.timed()
+def build_descendants(person: Person, graph: FamilyGraph, move_child_right: int = None, move_child_left: int = None, depth: Optional[int] = None, expanded: Set[tuple] = frozenset(), generations: Optional[int] = None, cancelled: Callable[[], bool] = None) -> LayoutUnit:
+    """Builds the descendants of person, each couple once, up to generations
+    below person (depth by default) and depth more below every unit whose
+    key is in expanded.
+    Raises AncestryCycleError if a person is their own descendant and
+    PlanCancelled once cancelled() returns True.
+    """
+    return _TreeBuilder(graph, depth, expanded, cancelled).descendants(person, depth if generations is None else generations, move_child_right, move_child_left)
+
+# =======================
+# LAYOUT
+# =======================
+
+def _place(root: LayoutUnit, with_parents: bool, with_children: bool, gen_offset: float) -> List[LayoutUnit]:
+    units: List[LayoutUnit] = []
+    with profiling.span("get_width"):
+        root.width = root.get_width(with_parents, with_children)
+    stack: List[LayoutUnit] = [root]
+    while stack:
+        unit = stack.pop()
+        units.append(unit)
+        unit.heads_x = (unit.width - unit.heads_width) / 2
+
+        next_units = unit.parents if with_parents else unit.children
+        if not next_units:
+            continue
+        next_width = (len(next_units) - 1) * MARGIN_UNITS
+        for next_unit in next_units:
+            next_unit.width = next_unit.get_width(with_parents, with_children)
+            next_width += next_unit.width
+
+        # next generation is packed left to right and centered under a wider unit
+        x = unit.x + max(0, (unit.width - next_width) / 2)
+        y = unit.y + gen_offset
+        for next_unit in next_units:
+            next_unit.x = x
+            next_unit.y = y
+            x += next_unit.width + MARGIN_UNITS
+        stack += reversed(next_units)
+    return units
+
+@profiling.timed()
+def layout_descendants(root: LayoutUnit) -> List[LayoutUnit]:
+    """Positions the root at (0, 0) and its descendants below it.
+    Returns all laid out units, parents before their children.
+    """
+    root.x = root.y = 0
+    return _place(root, False, True, GEN_OFFSET)
+
+@profiling.timed()
+def layout_ancestors(root: LayoutUnit) -> List[LayoutUnit]:
+    """Positions the ancestors of the root above it, the oldest generation at y = 0.
+    Returns all laid out units, children before their parents.
+    """
+    root.x = root.y = 0
+    units = _place(root, True, False, -GEN_OFFSET)
+    top = min(unit.y for unit in units)
+    for unit in units:
+        unit.y -= top
+    return units
+
+# =======================
+# WHOLE TREE
+# =======================
+
+@dataclass
+class PlacedTree:
+    root: LayoutUnit
+    x: float = 0
+    y: float = 0
+    visible: bool = True
+
+@dataclass
+class TreePlan:
+    """Ancestors of the reference person and the descendant branches drawn
+    below them, each with its offset from the scene origin.
+    """
+    ref_person: Person
+    roots: PlacedTree
+    branches: List[PlacedTree] = field(default_factory=list)
+
+@profiling.timed()
+def plan_tree(graph: FamilyGraph, ref_person: Person, depth: Optional[int] = None, expanded: Set[tuple] = frozenset(), cancelled: Callable[[], bool] = None) -> TreePlan:
+    """Builds and lays out the tree of ref_person, depth generations each way
+    (None for all) plus depth more beyond every unit whose key is in expanded.
+    Touches no Qt objects, so it can run on a worker thread; cancelled is
+    polled while building and PlanCancelled raised once it returns True.
+    """
+    roots = PlacedTree(build_ancestors(ref_person, graph, depth, expanded, cancelled))
+    layout_ancestors(roots.root)
+
+    # generations between the reference person and the top of the single parent line
+    ref_gen = 0
+    ref_unit = roots.root
+    while len(ref_unit.parents) == 1:
+        ref_unit = ref_unit.parents[0]
+        ref_gen += 1
+    branch_gens = None if depth is None else depth + ref_gen
+
+    draw_reference: Person = ref_unit.heads[0]
+    if draw_reference.id != ref_person.id:
+        ref_unit.hide()
+
+    roots.visible = len(ref_unit.parents) > 0
+
+    left_branch: Optional[PlacedTree] = None
+    right_branch: Optional[PlacedTree] = None
+    left_ref_unit: LayoutUnit = None
+    if len(ref_unit.parents) >= 2:
+        left_parents, right_parents = ref_unit.parents[0], ref_unit.parents[1]
+        left_parents.hide()
+        right_parents.hide()
+
+        branch_gens = None if branch_gens is None else branch_gens + 1
+        left_branch = PlacedTree(build_descendants(left_parents.heads[0], graph, move_child_right=ref_unit.heads[0].id, depth=depth, expanded=expanded, generations=branch_gens, cancelled=cancelled))
+        right_branch = PlacedTree(build_descendants(right_parents.heads[0], graph, move_child_left=ref_unit.heads[1].id, depth=depth, expanded=expanded, generations=branch_gens, cancelled=cancelled))
+        # the branches draw the parents in place of the hidden ancestor units
+        left_branch.root.more_parents = left_parents.more_parents
+        right_branch.root.more_parents = right_parents.more_parents
+        layout_descendants(left_branch.root)
+        layout_descendants(right_branch.root)
+
+        # align y
+        left_branch.y = right_branch.y = left_parents.y + MARGIN
+
+        #align branches to POI children
+        left_ref_unit = left_branch.root.find_child(ref_unit.heads[0])
+        left_branch.x = ref_unit.head_x() - left_ref_unit.head_x()
+        right_branch.x = ref_unit.head_x() - right_branch.root.find_child(ref_unit.heads[1]).head_x()
+    else:
+        left_branch = PlacedTree(build_descendants(draw_reference, graph, depth=depth, expanded=expanded, generations=branch_gens, cancelled=cancelled))
+        left_branch.root.more_parents = ref_unit.more_parents
+        layout_descendants(left_branch.root)
+        left_ref_unit = left_branch.root
+
+    sibling_ref_offset_x = left_branch.x + left_ref_unit.head_x()
+    root_ref_offset_x = ref_unit.head_x()
+
+    root_x_trans = max(0, sibling_ref_offset_x - root_ref_offset_x)
+    branch_x_trans = max(0, root_ref_offset_x - sibling_ref_offset_x)
+
+    #align graphs
+    roots.x, roots.y = MARGIN + root_x_trans, MARGIN
+    left_branch.x += MARGIN + branch_x_trans
+    if right_branch:
+        right_branch.x += MARGIN + branch_x_trans
+
+    plan = TreePlan(ref_person, roots, [left_branch])
+    if right_branch:
+        plan.branches.append(right_branch)
+
+        #align branches heads with the parents drawn by the roots
+        for branch, parents in ((left_branch, left_parents), (right_branch, right_parents)):
+            branch.root.x += roots.x + parents.head_x() - (branch.x + branch.root.head_x())
+
+        right_branch.root.find_child(ref_unit.heads[0]).hide()
+
+    return plan
@@ -0,0 +1,47 @@
+from typing import Optional, Set
+from PySide6.QtCore import QObject, QRunnable, Signal
+from family_graph import FamilyGraph
+from person import Person
+from tree_layout import PlanCancelled, plan_tree
+
+class TreePlanSignals(QObject):
+    # generation, TreePlan
+    finished = Signal(int, object)
+    # generation, message
+    failed = Signal(int, str)
+
+class TreePlanTask(QRunnable):
+    """Builds and lays out a tree on a QThreadPool thread. The plan comes back
+    through signals on the GUI thread, tagged with the generation the view
+    gave the task so results of stale requests can be told apart.
+    """
+
+    def __init__(self, graph: FamilyGraph, ref_person: Person, generation: int, depth: Optional[int] = None, expanded: Set[tuple] = frozenset()):
+        super().__init__()
+        self.graph = graph
+        self.ref_person = ref_person
+        self.generation = generation
+        self.depth = depth
+        # copied, the view keeps adding to its set meanwhile
+        self.expanded = frozenset(expanded)
+        self.cancelled = False
+        self.signals = TreePlanSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled
+
+    def run(self):
+        try:
+            plan = plan_tree(self.graph, self.ref_person, self.depth, self.expanded, self.is_cancelled)
+        except PlanCancelled:
+            return
+        except Exception as e:
+            # any error has to be reported, the view waits for this task until then
+            if not self.cancelled:
+                self.signals.failed.emit(self.generation, str(e) or type(e).__name__)
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(self.generation, plan)